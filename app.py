@@ -1,17 +1,14 @@
+import os
+import sys
+import time
+from contextlib import nullcontext
+
 import streamlit as st
-import pandas as pd
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationalRetrievalChain
 
-
-import os
+# Heavy dependencies (langchain, FAISS, sentence-transformers, pandas, plotly,
+# PyPDF2) are imported inside the functions that use them so the first page
+# renders without paying for them. See perf/startup.py for the import budget.
 from data_analysis.data_analysis import (
     parse_llm_summary,
     display_metric_summary,
@@ -27,26 +24,48 @@ from data_diagrams.data_diagrams import (
 )
 from data_analysis.predictive import DiseasePredictor
 from data_analysis.similarity import ReportComparator
+from data_analysis.dedup import get_dedup_index
+from sessions.manager import get_session_manager
 from data_analysis.trends import show_trend_analysis, detect_anomalies
+from perf.tracing import span, traced, start_metrics_server
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+# Only signed-in users (Streamlit OIDC login) may use patient shards
+PATIENT_SHARDS_REQUIRE_LOGIN = os.getenv("PATIENT_SHARDS_REQUIRE_LOGIN", "0") == "1"
 
 # Load environment variables
 load_dotenv()
 
 
+@st.cache_resource(show_spinner=False)
+def get_embeddings():
+    """Load the sentence-transformers model once per process, on first use"""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+
 def get_pdf_text(pdf_docs):
+    from PyPDF2 import PdfReader
+
     text = ""
-    for pdf in pdf_docs:
-        pdf_reader = PdfReader(pdf)
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+    with span("extraction") as stage:
+        stage.items = 0
+        for pdf in pdf_docs:
+            pdf_reader = PdfReader(pdf)
+            for page in pdf_reader.pages:
+                stage.items += 1
+                page_text = page.extract_text()
+                if page_text:
+                    text += page_text + "\n"
     if not text.strip():
         st.error("⚠️ No readable text found in uploaded PDFs! Please ensure they contain selectable text.")
         return None
     return text
 
 
+@traced("summarization")
 def summarize_text(text):
     try:
         api_key = os.getenv("TOGETHER_API_KEY")
@@ -54,11 +73,7 @@ def summarize_text(text):
             st.error("❌ API key missing! Please set TOGETHER_API_KEY in your environment variables.")
             return None
 
-        llm = ChatOpenAI(
-            base_url="https://api.together.xyz/v1",
-            api_key=api_key,
-            model="mistralai/Mixtral-8x7B-Instruct-v0.1",
-        )
+        from llm.client import get_client
 
         summary_prompt = (
             "You are a medical expert assistant. Carefully read and summarize the following medical report. "
@@ -78,14 +93,18 @@ def summarize_text(text):
             "Return metrics only in JSON format and other information in plain text.\n"
             f"{text}"
         )
-        summary = llm.predict(summary_prompt)
+        # Shared pooled client; identical in-flight prompts share one upstream call
+        summary = get_client(api_key).complete(summary_prompt)
         return summary
     except Exception as e:
         st.error(f"❌ Error generating summary: {e}")
         return None
 
 
+@traced("chunking", items=len)
 def get_text_chunks(text):
+    from langchain.text_splitter import CharacterTextSplitter
+
     text_splitter = CharacterTextSplitter(
         separator="\n",
         chunk_size=1000,
@@ -100,38 +119,82 @@ def get_text_chunks(text):
     return chunks
 
 
-def get_vectorstore(text_chunks):
+@traced("embedding", items=lambda vectorstore: vectorstore.index.ntotal)
+def get_vectorstore(text_chunks, metadata=None):
     if not text_chunks:
         raise ValueError("Error: No text chunks provided for FAISS indexing!")
 
-    model_name = "sentence-transformers/all-mpnet-base-v2"
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    from langchain_community.vectorstores import FAISS
 
     vectorstore = FAISS.from_texts(
         texts=text_chunks, 
-        embedding=embeddings,
-        metadatas=[{}]*len(text_chunks))
+        embedding=get_embeddings(),
+        metadatas=[dict(metadata or {}) for _ in text_chunks])
     return vectorstore
 
 
-def get_conversation_chain(vectorstore):
+def signed_in_user():
+    """Email (or subject) of the user signed in through Streamlit's login, else None"""
+    try:
+        if st.user.is_logged_in:
+            return st.user.get("email") or st.user.get("sub")
+    except Exception:
+        pass
+    return None
+
+
+def patient_namespaces(patient_id):
+    """Shard namespace for the sidebar Patient ID: () when unset or not allowed, else one namespace.
+
+    There is no access control beyond this: without login, anyone who knows a
+    Patient ID can chat with that patient's shard. When a user is signed in,
+    the namespace is prefixed with their identity so IDs never cross accounts.
+    """
+    patient_id = (patient_id or "").strip()
+    if not patient_id or "," in patient_id:
+        return ()
+    owner = signed_in_user()
+    if owner:
+        return (f"{owner}/{patient_id}",)
+    return () if PATIENT_SHARDS_REQUIRE_LOGIN else (patient_id,)
+
+
+def get_retriever(vectorstore, namespaces=()):
+    """Per-patient shard retriever when namespaces are given, else hybrid search over the session index"""
+    if namespaces:
+        from vectorstores.retriever import ShardedRetriever
+        from vectorstores.sharded import get_shard_store
+
+        return ShardedRetriever(store=get_shard_store(get_embeddings()), namespaces=list(namespaces))
+    if os.getenv("HYBRID_RETRIEVAL", "1") == "0":
+        return vectorstore.as_retriever()
+
+    from vectorstores.retriever import HybridRetriever
+
+    return HybridRetriever.from_vectorstore(vectorstore)
+
+
+@traced("chain_setup")
+def get_conversation_chain(vectorstore, memory=None, namespaces=()):
     try:
         api_key = os.getenv("TOGETHER_API_KEY")
         if not api_key:
             st.error("❌ API key missing! Please set TOGETHER_API_KEY in your environment variables.")
             return None
 
-        llm = ChatOpenAI(
-            base_url="https://api.together.xyz/v1",
-            api_key=api_key,
-            model="mistralai/Mixtral-8x7B-Instruct-v0.1",
-        )
+        from langchain.memory import ConversationBufferMemory
+        from langchain.chains import ConversationalRetrievalChain
+        from llm.client import get_llm
 
-        memory = ConversationBufferMemory(memory_key='chat_history', return_messages=True)
+        llm = get_llm(api_key)
+
+        # Reuse the chat history when the chain is rebuilt after a session reload
+        if memory is None:
+            memory = ConversationBufferMemory(memory_key='chat_history', return_messages=True)
 
         conversation_chain = ConversationalRetrievalChain.from_llm(
             llm=llm,
-            retriever=vectorstore.as_retriever(),
+            retriever=get_retriever(vectorstore, namespaces),
             memory=memory
         )
         return conversation_chain
@@ -140,145 +203,404 @@ def get_conversation_chain(vectorstore):
         return None
 
 
+def current_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+
+def get_session_conversation(manager, session_id, namespaces=()):
+    """Conversation chain for a session, rebuilt after a spill or a patient change"""
+    conversation = manager.get(session_id, 'conversation')
+    if conversation is not None and manager.get(session_id, 'namespaces', ()) != namespaces:
+        conversation = None
+    if conversation is None:
+        vectorstore = None if namespaces else manager.get(session_id, 'vectorstore')
+        if vectorstore is None and not namespaces:
+            return None
+        conversation = get_conversation_chain(
+            vectorstore, memory=manager.get(session_id, 'chat_memory'), namespaces=namespaces
+        )
+        if conversation:
+            manager.put(
+                session_id, conversation=conversation, chat_memory=conversation.memory, namespaces=namespaces
+            )
+    return conversation
+
+
 def handle_userinput(user_question):
-    if st.session_state.conversation:
-        response = st.session_state.conversation({'question': user_question})
+    manager = get_session_manager()
+    conversation = get_session_conversation(
+        manager, current_session_id(), patient_namespaces(st.session_state.get("patient_id"))
+    )
+    if conversation:
+        response = conversation({'question': user_question})
         st.session_state.chat_history = response['chat_history']
+        return True
+    st.warning("⚠️ No conversation started yet! Upload PDFs and process them first.")
+    return False
 
-        for i, message in enumerate(st.session_state.chat_history):
-            role = "User" if i % 2 == 0 else "Bot"
-            st.write(f"**{role}:** {message.content}")
-    else:
-        st.warning("⚠️ No conversation started yet! Upload PDFs and process them first.")
+
+def render_chat_history():
+    for i, message in enumerate(st.session_state.chat_history or []):
+        role = "User" if i % 2 == 0 else "Bot"
+        st.write(f"**{role}:** {message.content}")
+
+
+def reuse_duplicate_result(job, dedup_index, dedup_key, duplicate_of, similarity):
+    """Result of an earlier job for a near-duplicate upload, or None if it is gone"""
+    previous = job.scheduler.result(duplicate_of)
+    if not previous or not os.path.isdir(previous['vectorstore_path']):
+        return None
+
+    dedup_index.add(job.job_id, *dedup_key)
+
+    previous.pop('trace', None)
+    return {**previous, 'duplicate_of': duplicate_of, 'duplicate_similarity': similarity}
+
+
+def index_for_patient(patient_id, text_chunks, source_job_id, filenames):
+    """Append a report's chunks to the patient's shard (once per source job)"""
+    from vectorstores.sharded import get_shard_store
+
+    get_shard_store(get_embeddings()).add_texts(
+        patient_id,
+        text_chunks,
+        metadatas=[{'job_id': source_job_id, 'files': ", ".join(filenames)}] * len(text_chunks),
+        dedup_key='job_id'
+    )
+
+
+def process_reports(job, pdf_files, previous_vectorstore=None, patient_id=None, scope=None):
+    """Run the processing stages on a background worker (see jobs/scheduler.py).
+
+    `pdf_files` is a list of (filename, bytes). Returns a picklable result; the
+    FAISS index is saved under the job directory (`vectorstore_path`). Earlier
+    results are only reused for uploads in the same scope (the patient, else
+    `scope`, e.g. the session); without either nothing is reused.
+    """
+    from data_analysis.dedup import fingerprint
+
+    import io
+    import pandas as pd
+
+    warnings = []
+
+    job.progress("extraction", 0.05)
+    raw_text = get_pdf_text([io.BytesIO(data) for _, data in pdf_files])
+    if not raw_text:
+        raise ValueError("No readable text found in uploaded PDFs! Please ensure they contain selectable text.")
+
+    # Skip summarization, embedding and indexing for re-uploads of a processed report
+    job.progress("duplicate_check", 0.1)
+    dedup_index = get_dedup_index()
+    with span("duplicate_check") as stage:
+        dedup_key = (
+            dedup_index.signature(raw_text),
+            fingerprint(raw_text),
+            f"patient:{patient_id}" if patient_id else f"session:{scope or job.job_id}",
+        )
+        match = dedup_index.find(*dedup_key)
+        stage.items = 1 if match else 0
+    if match:
+        reused = reuse_duplicate_result(job, dedup_index, dedup_key, *match)
+        if reused:
+            if patient_id:
+                job.progress("patient_index", 0.95)
+                index_for_patient(patient_id, reused['text_chunks'], match[0], reused['filenames'])
+            return reused
+        dedup_index.remove(match[0])
+
+    job.progress("summarization", 0.15)
+    summary = summarize_text(raw_text)
+    if not summary:
+        warnings.append("Summary could not be generated. Check TOGETHER_API_KEY and the LLM endpoint.")
+
+    job.progress("parsing", 0.35)
+    with span("parsing") as stage:
+        parsed_data = parse_llm_summary(summary or "")
+        stage.items = len(parsed_data)
+
+    # 1. Disease risk prediction
+    job.progress("risk_prediction", 0.4)
+    with span("risk_prediction") as stage:
+        predictor = DiseasePredictor()
+        metrics_dict = {item['metric']: item['value'] for item in parsed_data}
+        risk_assessment = predictor.predict_risk(metrics_dict)
+        stage.items = len(risk_assessment)
+
+    # 2. Similar Report Detection against the session's previous reports
+    similar_reports = []
+    if previous_vectorstore is not None:
+        job.progress("similarity_search", 0.45)
+        with span("similarity_search") as stage:
+            comparator = ReportComparator(previous_vectorstore)
+            text_embedding = get_embeddings().embed_query(raw_text)
+            similar_reports = comparator.find_similar_reports(text_embedding)
+            stage.items = len(similar_reports)
+
+    # 3. Time Series Analysis: one summary per report
+    historical_data = []
+    if len(pdf_files) > 1:
+        for i, (_, data) in enumerate(pdf_files):
+            job.progress("trend_analysis", 0.5 + 0.15 * i / len(pdf_files))
+            text = get_pdf_text([io.BytesIO(data)])
+            if text:
+                report_summary = summarize_text(text)
+                if report_summary:
+                    historical_data.append(parse_llm_summary(report_summary))
+
+    # PDF Report
+    job.progress("pdf_export", 0.65)
+    with span("pdf_export", items=len(parsed_data)):
+        pdf_report = create_clinical_summary_pdf(pd.DataFrame(parsed_data))
+
+    # Text chunking + vectorstore
+    job.progress("chunking", 0.75)
+    text_chunks = get_text_chunks(raw_text)
+    if not text_chunks:
+        raise ValueError("No valid text chunks found! Ensure PDFs contain readable text.")
+
+    job.progress("embedding", 0.8)
+    # Per-report metadata lets the next upload's similarity step name this report
+    vectorstore = get_vectorstore(
+        text_chunks, metadata={'job_id': job.job_id, 'files': ", ".join(name for name, _ in pdf_files)}
+    )
+    vectorstore_path = job.path("faiss")
+    # Only the saved copy outlives the job; the session that loads it counts it in its budget
+    vectorstore.save_local(vectorstore_path)
+    # Later uploads of the same report reuse this job's results
+    dedup_index.add(job.job_id, *dedup_key)
+
+    if patient_id:
+        job.progress("patient_index", 0.95)
+        index_for_patient(patient_id, text_chunks, job.job_id, [name for name, _ in pdf_files])
+
+    return {
+        'filenames': [name for name, _ in pdf_files],
+        'pdf_text': raw_text,
+        'summary': summary,
+        'parsed_data': parsed_data,
+        'risk_assessment': risk_assessment,
+        'similar_reports': similar_reports,
+        'historical_data': historical_data,
+        'pdf_report': pdf_report,
+        'text_chunks': text_chunks,
+        'vectorstore_path': vectorstore_path,
+        'warnings': warnings,
+    }
+
+
+def load_job_vectorstore(result):
+    """FAISS index of a finished job, loaded from the job directory"""
+    from langchain_community.vectorstores import FAISS
+
+    return FAISS.load_local(
+        result['vectorstore_path'],
+        get_embeddings(),
+        allow_dangerous_deserialization=True
+    )
+
+
+def render_results(result, first_render=True):
+    """Display a finished job's results; cheap, so it runs on every rerun.
+
+    Only a job's first render is traced, so polling reruns don't inflate the charting metrics.
+    """
+    import pandas as pd
+
+    for warning in result['warnings']:
+        st.warning(f"⚠️ {warning}")
+
+    if result.get('duplicate_of'):
+        st.info(
+            f"♻️ This upload matches an earlier report ({result['duplicate_similarity']:.0%} similar); "
+            "reusing its summary, metrics and index."
+        )
+
+    summary = result['summary']
+    if summary:
+        st.download_button(
+            "📥 Download Medical Summary", 
+            summary.encode('utf-8'), 
+            file_name="medical_summary.txt", 
+            mime="text/plain"
+        )
+
+    parsed_data = result['parsed_data']
+    # Convert to DataFrame for diagrams
+    metrics_df = pd.DataFrame(parsed_data)
+
+    risk_assessment = result['risk_assessment']
+    st.subheader("🩺 Disease Risk Assessment")
+    if 'anemia' in risk_assessment:
+        st.progress(risk_assessment['anemia']['probability'])
+        st.markdown(risk_assessment['anemia']['advice'])
+
+    if result['similar_reports']:
+        st.subheader("🔍 Similar Reports Found")
+        for report, similarity in result['similar_reports']:
+            st.write(f"**{similarity:.1%} match**: {report.get('files') or 'earlier upload in this session'}")
+
+    if result['historical_data']:
+        # One row per uploaded report, in upload order
+        history = pd.DataFrame([
+            {'date': i + 1, **{m['metric']: pd.to_numeric(m['value'], errors='coerce') for m in parsed}}
+            for i, parsed in enumerate(result['historical_data'])
+        ])
+        show_trend_analysis(history, [col for col in history.columns if col != 'date'])
+
+    display_metric_summary(parsed_data)
+    predict_conditions(parsed_data)
+
+    # New visualizations
+    with span("charting", items=len(metrics_df)) if first_render else nullcontext():
+        st.subheader("📈 Interactive Visual Analysis")
+        col1, col2 = st.columns(2)
+        with col1:
+            plot_metric_comparison(metrics_df)
+        with col2:
+            generate_radial_health_score(metrics_df)
+
+        # Interactive table
+        display_reference_table(metrics_df)
+
+    st.download_button(
+       "📄 Download Full PDF Report",
+       result['pdf_report'],
+       "clinical_report.pdf",
+       "application/pdf"
+    )
+
+    # Existing CSV download
+    download_metrics(parsed_data)
 
 
 def main():
+    from jobs.scheduler import DONE, FAILED, get_scheduler
+
     st.set_page_config(page_title="Medical Chatbot", page_icon="⚕️")
+    # Prometheus-style /metrics endpoint, only when METRICS_PORT is set
+    start_metrics_server()
 
-    for key in ["conversation", "chat_history", "pdf_text", "text_chunks", "vectorstore", "summary"]:
+    # Report text, chunks and the FAISS index live in the session manager, not session_state
+    for key in ["chat_history", "last_trace", "job_id", "loaded_job", "answered_question"]:
         if key not in st.session_state:
             st.session_state[key] = None
 
     st.header("⚕️ Chat with Medical Reports")
 
     user_question = st.text_input("Ask a question about your medical report:")
-    if user_question:
-        handle_userinput(user_question)
+    # Job polling reruns the script every JOB_POLL_SECONDS; only send a question to the LLM once
+    if user_question and user_question != st.session_state.answered_question:
+        if handle_userinput(user_question):
+            st.session_state.answered_question = user_question
+    render_chat_history()
 
     with st.sidebar:
+        st.text_input(
+            "🪪 Patient ID (optional)",
+            key="patient_id",
+            help="Reports are also indexed under this ID so later sessions can chat with them."
+        )
+        patient_id = (st.session_state.get("patient_id") or "").strip()
+        namespaces = patient_namespaces(patient_id)
+        if "," in patient_id:
+            st.error("⚠️ Enter a single Patient ID; searching several patients at once is not supported.")
+        elif patient_id and not namespaces:
+            st.warning("🔒 Sign in to use patient records.")
+            st.button("Sign in", on_click=st.login)
+
         st.subheader("📄 Upload Medical Reports (PDF)")
         pdf_docs = st.file_uploader("Upload PDFs and click 'Process'", accept_multiple_files=True)
+        scheduler = get_scheduler()
+        manager = get_session_manager()
+        session_id = current_session_id()
 
         if st.button("🚀 Process"):
-            with st.spinner("⏳ Processing..."):
-                if not pdf_docs:
-                    st.error("⚠️ Please upload at least one PDF file!")
-                    return
-
-                raw_text = get_pdf_text(pdf_docs)
-                if not raw_text:
-                    return
-
-                st.session_state.pdf_text = raw_text
-
-                # Generate summary but DO NOT display it
-                summary = summarize_text(raw_text)
-                if summary:
-                    st.session_state.summary = summary
-                    st.download_button(
-                        "📥 Download Medical Summary", 
-                        summary.encode('utf-8'), 
-                        file_name="medical_summary.txt", 
-                        mime="text/plain"
-                    )
-
-                # Extract health metrics and display
-                parsed_data = parse_llm_summary(summary)
-                 # Convert to DataFrame for diagrams
-                metrics_df = pd.DataFrame(parsed_data)
-                
-                # 1. Disease risk prediction
-                predictor = DiseasePredictor()
-                metrics_dict = {item['metric']: item['value'] for item in parsed_data}
-                risk_assessment = predictor.predict_risk(metrics_dict)
-                
-                st.subheader("🩺 Disease Risk Assessment")
-                if 'anemia' in risk_assessment:
-                    st.progress(risk_assessment['anemia']['probability'])
-                    st.markdown(risk_assessment['anemia']['advice'])
-                    
-                # 2. Similar Report Detection
-                comparator = ReportComparator(st.session_state.vectorstore)
-                # Compute embedding for the current report text
-                embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-                text_embedding = embedding_model.embed_documents(raw_text)
-                similar_reports = comparator.find_similar_reports(text_embedding)
-                
-                if similar_reports:
-                    st.subheader("🔍 Similar Reports Found")
-                    for report, similarity in similar_reports:
-                        st.write(f"**{similarity:.1%} match**: {report['diagnosis']}")
-
-                
-                # 3. Time Series Analysis
-                if len(pdf_docs) > 1:  # Only show trends if multiple reports
-                    # Process multiple reports to extract historical data
-                    def process_multiple_reports(pdf_docs):
-                        historical_data = []
-                        for pdf in pdf_docs:
-                            text = get_pdf_text([pdf])
-                            if text:
-                                summary = summarize_text(text)
-                                if summary:
-                                    parsed = parse_llm_summary(summary)
-                                    historical_data.append(parsed)
-                        return historical_data
-
-                    historical_data = process_multiple_reports(pdf_docs)
-                    show_trend_analysis(historical_data)
-        
-                
-                display_metric_summary(parsed_data)
-                predict_conditions(parsed_data)
-                
-                # New visualizations
-                st.subheader("📈 Interactive Visual Analysis")
-                col1, col2 = st.columns(2)
-                with col1:
-                    plot_metric_comparison(metrics_df)
-                with col2:
-                    generate_radial_health_score(metrics_df)
-                    
-                # Interactive table
-                display_reference_table(metrics_df)
-                
-                # PDF Report
-                pdf_report = create_clinical_summary_pdf(metrics_df)
-                st.download_button(
-                   "📄 Download Full PDF Report",
-                   pdf_report,
-                   "clinical_report.pdf",
-                   "application/pdf"
+            if not pdf_docs:
+                st.error("⚠️ Please upload at least one PDF file!")
+                return
+
+            pdf_files = [(pdf.name, pdf.getvalue()) for pdf in pdf_docs]
+            st.session_state.job_id = scheduler.submit(
+                process_reports, pdf_files, manager.get(session_id, 'vectorstore'),
+                patient_id=namespaces[0] if namespaces else None, scope=session_id
+            )
+
+        job_id = st.session_state.job_id
+        job = scheduler.status(job_id) if job_id else None
+        if job and job['status'] == FAILED:
+            st.error(f"❌ Error during {job['stage']}: {job['error']}")
+        elif job and job['status'] == DONE:
+            result = scheduler.result(job_id)
+            first_render = st.session_state.loaded_job != job_id
+            if first_render:
+                vectorstore = load_job_vectorstore(result)
+                conversation = get_conversation_chain(vectorstore, namespaces=namespaces)
+                manager.put(
+                    session_id,
+                    pdf_text=result['pdf_text'],
+                    summary=result['summary'],
+                    text_chunks=result['text_chunks'],
+                    vectorstore=vectorstore,
+                    conversation=conversation,
+                    chat_memory=conversation.memory if conversation else None,
+                    namespaces=namespaces
                 )
-                
-                # Existing CSV download
-                download_metrics(parsed_data)
-
-                # Text chunking + vectorstore + conversation setup
-                text_chunks = get_text_chunks(raw_text)
-                if not text_chunks:
-                    return
-
-                st.session_state.text_chunks = text_chunks
-
-                try:
-                    vectorstore = get_vectorstore(text_chunks)
-                    st.session_state.vectorstore = vectorstore
-                    st.session_state.conversation = get_conversation_chain(vectorstore)
-                    st.success("✅ Processing complete! You can now ask questions.")
-                except ValueError as e:
-                    st.error(f"❌ Error: {e}")
-
+                st.session_state.last_trace = result['trace']
+                st.session_state.loaded_job = job_id
+            render_results(result, first_render)
+            st.success("✅ Processing complete! You can now ask questions.")
+        elif job:
+            st.progress(job['progress'], text=f"⏳ Processing: {job['stage']}...")
+
+        if st.checkbox("⏱️ Show timing breakdown") and st.session_state.last_trace:
+            rows = st.session_state.last_trace
+            total = sum(row['wall_seconds'] for row in rows if not row.get('nested'))
+            st.caption(f"Run {st.session_state.loaded_job}: {total:.2f}s")
+            st.dataframe(
+                [
+                    {k: row[k] for k in ('span', 'wall_seconds', 'cpu_seconds', 'peak_memory_bytes', 'items')}
+                    for row in rows
+                ],
+                hide_index=True,
+                use_container_width=True
+            )
+
+        with st.expander("🧵 Job queue"):
+            st.json(scheduler.metrics())
+
+        with st.expander("🧠 Session memory"):
+            usage = manager.usage(session_id)
+            st.caption(
+                f"This session: {usage['resident_bytes'] / 1e6:.1f} MB"
+                f"{' (spilled to disk)' if usage['spilled'] else ''}"
+            )
+            st.json({'artifacts': usage['artifacts'], 'all_sessions': manager.metrics()})
+            st.dataframe(manager.report(), hide_index=True, use_container_width=True)
+
+        shard_store = sys.modules.get("vectorstores.sharded")
+        shard_metrics = shard_store.get_metrics() if shard_store else {}
+        if shard_metrics:
+            with st.expander("🗂️ Patient shards"):
+                st.json(shard_metrics)
+
+        with st.expander("♻️ Duplicate detection"):
+            st.json(get_dedup_index().stats())
+
+        # Only report pool metrics once the client module has been loaded by a request
+        llm_client = sys.modules.get("llm.client")
+        llm_metrics = llm_client.get_metrics() if llm_client else {}
+        if llm_metrics:
+            with st.expander("🔌 LLM connection pool"):
+                st.json(llm_metrics)
+
+    # Poll until the background job finishes; results are read back from the job store
+    if job and job['status'] not in (DONE, FAILED):
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
 
 
 if __name__ == '__main__':
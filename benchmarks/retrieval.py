@@ -0,0 +1,196 @@
+# retrieval.py
+"""Recall@k and latency of dense, BM25 and hybrid retrieval for report chat.
+
+Questions come from two labeled sets, each searched against its own report
+chunked exactly like the app (`app.get_text_chunks`):
+
+- `benchmarks/questions.json`: hand-written questions about the sample report,
+  each with an answer string that must appear in a retrieved chunk
+- synthetic lab reports, with one question per lab line ("TSH 5.2 mIU/L") and,
+  for labs that appear once, one by name only ("What was the TSH result?")
+
+    python -m benchmarks.retrieval                        # results/retrieval-<commit>.json
+    python -m benchmarks.retrieval --skip-dense           # no embedding model needed
+    python -m benchmarks.retrieval --rerankers overlap cross-encoder
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from benchmarks.run import RESULTS_DIR, git_commit, percentile
+from benchmarks.synthetic import generate_report
+from perf.tracing import logger as trace_logger
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def normalize(text):
+    """Lowercase without whitespace; PDF extraction splits words unpredictably ("2 0 June")"""
+    return re.sub(r"\s+", "", text.lower()).replace("’", "'")
+
+
+def sample_report_case(path=QUESTIONS_PATH):
+    """(name, text, questions) for the hand-labeled sample report"""
+    import app
+
+    with open(path) as f:
+        labeled = json.load(f)
+    with open(os.path.join(ROOT_DIR, labeled['source']), 'rb') as f:
+        text = app.get_pdf_text([io.BytesIO(f.read())])
+    return "sample_report", text, labeled['questions']
+
+
+def synthetic_cases(reports, pages, metrics_per_page, filler_lines):
+    """(name, text, questions) per synthetic report, labeled from its generated metrics"""
+    import app
+
+    for seed in range(reports):
+        pdf_bytes, meta = generate_report(seed, pages, metrics_per_page, filler_lines)
+        text = app.get_pdf_text([io.BytesIO(pdf_bytes)])
+        counts = Counter(item['metric'] for item in meta['metrics'])
+        questions = []
+        for item in meta['metrics']:
+            line = f"{item['metric']}: {item['value']} {item['unit']}"
+            questions.append({'question': f"{item['metric']} {item['value']} {item['unit']}", 'answer': line})
+            if counts[item['metric']] == 1:
+                questions.append({'question': f"What was the {item['metric']} result?", 'answer': line})
+        yield f"synthetic_{seed:03d}", text, questions
+
+
+def build_searchers(chunks, modes, skip_dense):
+    """name -> search(query, k) returning chunk positions"""
+    from vectorstores.hybrid import BM25Index, HybridSearcher
+
+    searchers = {}
+    dense = None
+    if not skip_dense:
+        import app
+        from vectorstores.retriever import faiss_dense_search
+
+        dense = faiss_dense_search(app.get_vectorstore(chunks))
+        searchers['dense'] = lambda query, k: dense(query, k)
+
+    bm25 = BM25Index(chunks)
+    searchers['bm25'] = lambda query, k: [doc_id for _, doc_id in bm25.search(query, k)]
+
+    for reranker in modes:
+        if dense is None and reranker == "none":
+            # Fusing a single ranking just reproduces it
+            continue
+        name = ("hybrid" if dense is not None else "bm25") + ("" if reranker == "none" else f"+{reranker}")
+        searcher = HybridSearcher(chunks, dense_search=dense, reranker=reranker)
+        searchers[name] = lambda query, k, searcher=searcher: [doc_id for _, doc_id in searcher.search(query, k)]
+    return searchers
+
+
+def evaluate(cases, ks, modes, skip_dense):
+    """Per-mode recall@k and per-query latency over every case"""
+    import app
+
+    max_k = max(ks)
+    totals = {}
+    skipped = 0
+    for name, text, questions in cases:
+        chunks = app.get_text_chunks(text) or []
+        normalized = [normalize(chunk) for chunk in chunks]
+        searchers = build_searchers(chunks, modes, skip_dense)
+
+        for question in questions:
+            answer = normalize(question['answer'])
+            if not any(answer in chunk for chunk in normalized):
+                # Answer split across a chunk boundary: no retriever can find it
+                skipped += 1
+                print(f"  {name}: answer not in any chunk, skipped: {question['answer']!r}", file=sys.stderr)
+                continue
+
+            for mode, search in searchers.items():
+                stats = totals.setdefault(mode, {'latencies': [], 'hits': Counter(), 'queries': 0})
+                start = time.perf_counter()
+                positions = search(question['question'], max_k)
+                stats['latencies'].append(time.perf_counter() - start)
+                stats['queries'] += 1
+                first_hit = next((rank for rank, i in enumerate(positions, 1) if answer in normalized[i]), None)
+                for k in ks:
+                    if first_hit is not None and first_hit <= k:
+                        stats['hits'][k] += 1
+
+    results = {}
+    for mode, stats in totals.items():
+        latencies = stats['latencies']
+        results[mode] = {
+            'queries': stats['queries'],
+            **{f"recall@{k}": stats['hits'][k] / stats['queries'] for k in ks},
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'max_ms': max(latencies) * 1000,
+        }
+    return results, skipped
+
+
+def print_table(results, ks):
+    header = f"{'retriever':<26}{'queries':>8}" + "".join(f"{f'R@{k}':>8}" for k in ks)
+    print(header + f"{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, stats in results.items():
+        print(
+            f"{mode:<26}{stats['queries']:>8}"
+            + "".join(f"{stats[f'recall@{k}']:>8.2f}" for k in ks)
+            + f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark report-chat retrieval quality and latency")
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 4, 10])
+    parser.add_argument('--rerankers', nargs='+', default=['none', 'overlap'],
+                        choices=['none', 'overlap', 'cross-encoder'],
+                        help="Hybrid variants to evaluate ('none' is plain RRF)")
+    parser.add_argument('--skip-dense', action='store_true',
+                        help="Lexical only; no sentence-transformers model is loaded")
+    parser.add_argument('--no-sample', action='store_true', help="Skip the hand-labeled sample report")
+    parser.add_argument('--reports', type=int, default=10, help="Synthetic reports (0 to skip)")
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--metrics-per-page', type=int, default=8)
+    parser.add_argument('--filler-lines', type=int, default=20)
+    parser.add_argument('--out', help="Result file (default: benchmarks/results/retrieval-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    # Per-span JSON logs would swamp the benchmark output
+    trace_logger.setLevel(logging.WARNING)
+    ks = sorted(set(args.k))
+
+    sections = {}
+    if not args.no_sample:
+        sections['sample_report'] = [sample_report_case()]
+    if args.reports:
+        sections['synthetic'] = synthetic_cases(args.reports, args.pages, args.metrics_per_page, args.filler_lines)
+
+    results = {
+        'commit': git_commit(),
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'config': {key: value for key, value in vars(args).items() if key != 'out'},
+        'sets': {},
+    }
+    for section, cases in sections.items():
+        print(f"  {section} ...", file=sys.stderr)
+        scores, skipped = evaluate(cases, ks, args.rerankers, args.skip_dense)
+        results['sets'][section] = {'skipped_questions': skipped, 'retrievers': scores}
+        print(f"\n{section}")
+        print_table(scores, ks)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"retrieval-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
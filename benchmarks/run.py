@@ -0,0 +1,381 @@
+# run.py
+"""Micro and macro benchmarks for the report pipeline.
+
+    python -m benchmarks.run                       # all stages, results/<commit>.json
+    python -m benchmarks.run --stages parse risk   # a subset of micro-benchmarks
+    python -m benchmarks.run --skip embedding      # skip the sentence-transformers model
+    python -m benchmarks.run compare old.json new.json
+
+The LLM is replaced by the deterministic stub in `benchmarks.stub_llm`, so runs
+are repeatable and need no API key or network (except for the embedding model).
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.stub_llm import start_stub_llm
+from benchmarks.synthetic import generate_report
+from perf.tracing import exclusive_memory_peak, logger as trace_logger, max_rss_bytes
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(fn, repeat=10, warmup=1, items=1):
+    """Time `fn` `repeat` times, then run it once more under tracemalloc for peak memory"""
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    gc.collect()
+    # Spans inside `fn` would otherwise reset the peak this reads
+    with exclusive_memory_peak():
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        'repeat': repeat,
+        'items_per_call': items,
+        'mean_seconds': total / repeat,
+        'p50_seconds': percentile(latencies, 50),
+        'p90_seconds': percentile(latencies, 90),
+        'p99_seconds': percentile(latencies, 99),
+        'max_seconds': max(latencies),
+        'calls_per_second': repeat / total if total else None,
+        'items_per_second': repeat * items / total if total else None,
+        'peak_memory_bytes': peak,
+    }
+
+
+def build_inputs(pages, metrics_per_page, filler_lines, reports):
+    """Synthetic PDFs plus the derived text, summary and metrics each stage consumes"""
+    from benchmarks.stub_llm import stub_summary
+    from data_analysis.data_analysis import parse_llm_summary
+
+    pdfs, expected = [], []
+    for seed in range(reports):
+        pdf_bytes, meta = generate_report(seed, pages, metrics_per_page, filler_lines)
+        pdfs.append(pdf_bytes)
+        expected.append(meta)
+
+    import app
+
+    text = app.get_pdf_text([io.BytesIO(pdfs[0])])
+    summary = stub_summary(text)
+    parsed = parse_llm_summary(summary)
+    return {
+        'pdfs': pdfs,
+        'expected': expected,
+        'text': text,
+        'summary': summary,
+        'parsed': parsed,
+        'chunks': app.get_text_chunks(text),
+    }
+
+
+def historical_frame(expected):
+    """One row per report with a date column and one column per metric"""
+    import pandas as pd
+
+    rows = []
+    for i, meta in enumerate(expected):
+        row = {'date': pd.Timestamp("2024-01-01") + pd.Timedelta(days=30 * i)}
+        row.update({m['metric']: m['value'] for m in meta['metrics']})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def micro_benchmarks(inputs, stages, repeat):
+    import app
+    import pandas as pd
+    from data_analysis.data_analysis import parse_llm_summary
+    from data_analysis.predictive import DiseasePredictor
+    from data_analysis.trends import detect_anomalies
+    from data_diagrams.data_diagrams import create_clinical_summary_pdf
+
+    metrics_df = pd.DataFrame(inputs['parsed'])
+    metrics_dict = {item['metric']: item['value'] for item in inputs['parsed']}
+    history = historical_frame(inputs['expected'])
+    trend_metrics = [col for col in history.columns if col != 'date']
+    predictor = DiseasePredictor()
+
+    benches = {
+        'extraction': (lambda: app.get_pdf_text([io.BytesIO(inputs['pdfs'][0])]), 1),
+        'chunking': (lambda: app.get_text_chunks(inputs['text']), len(inputs['chunks'])),
+        'embedding': (lambda: app.get_vectorstore(inputs['chunks']), len(inputs['chunks'])),
+        'parse': (lambda: parse_llm_summary(inputs['summary']), len(inputs['parsed'])),
+        'risk': (lambda: predictor.predict_risk(metrics_dict), 1),
+        'trends': (
+            lambda: [detect_anomalies(history, metric) for metric in trend_metrics],
+            len(trend_metrics),
+        ),
+        'pdf_export': (lambda: create_clinical_summary_pdf(metrics_df), 1),
+    }
+
+    results = {}
+    for name, (fn, items) in benches.items():
+        if name not in stages:
+            continue
+        print(f"  micro {name} ...", file=sys.stderr)
+        # Model-backed stages are slow; fewer repeats keep the suite usable
+        stage_repeat = max(1, repeat // 5) if name in ('embedding', 'pdf_export') else repeat
+        try:
+            results[name] = measure(fn, stage_repeat, items=items)
+        except Exception as e:
+            results[name] = {'error': f"{type(e).__name__}: {e}"}
+    return results
+
+
+def macro_benchmark(inputs, stages, repeat):
+    """The app's own pipeline: `app.process_reports` submitted to a JobScheduler worker.
+
+    `pipeline` times one new report end to end (submit to done), `duplicate_reupload`
+    a re-upload that reuses an earlier job's results, and `multi_report` one job
+    with several reports (adds per-report trend summaries). Jobs, the dedup index
+    and the FAISS indexes live in a temporary directory.
+    """
+    import tempfile
+
+    import app
+    from data_analysis.dedup import NearDuplicateIndex
+    from jobs.scheduler import DONE, FAILED, JobScheduler
+
+    pdfs = inputs['pdfs']
+    patched = {'get_dedup_index': app.get_dedup_index, 'get_embeddings': app.get_embeddings}
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as tmp:
+        scheduler = JobScheduler(store_dir=os.path.join(tmp, "jobs"), workers=1)
+        dedup_index = NearDuplicateIndex(path=os.path.join(tmp, "dedup.sqlite3"))
+        app.get_dedup_index = lambda: dedup_index
+        if 'embedding' not in stages:
+            # Same fallback the tests use; the real model needs a download
+            from langchain_core.embeddings import DeterministicFakeEmbedding
+
+            embeddings = DeterministicFakeEmbedding(size=384)
+            app.get_embeddings = lambda: embeddings
+
+        traces = []
+
+        def process(files, scope):
+            job_id = scheduler.submit(app.process_reports, files, scope=scope)
+            while True:
+                status = scheduler.status(job_id)
+                if status['status'] == FAILED:
+                    raise RuntimeError(f"process_reports failed during {status['stage']}: {status['error']}")
+                if status['status'] == DONE:
+                    break
+                time.sleep(0.005)
+            result = scheduler.result(job_id)
+            if not result['summary']:
+                # process_reports only warns when summarization fails; timing that path is meaningless
+                raise RuntimeError("process_reports got no summary from the stub LLM")
+            traces.append(result['trace'])
+            return result
+
+        state = {'next': 0}
+
+        def new_report():
+            # A fresh scope per call, so no upload is treated as a re-upload
+            state['next'] += 1
+            pdf_bytes = pdfs[state['next'] % len(pdfs)]
+            result = process([(f"report-{state['next']}.pdf", pdf_bytes)], f"benchmark-{state['next']}")
+            if result.get('duplicate_of'):
+                raise RuntimeError("a new report was treated as a re-upload")
+
+        def reupload():
+            if not process([("rescan.pdf", pdfs[0])], "benchmark-reupload").get('duplicate_of'):
+                raise RuntimeError("the re-upload was not recognised as a duplicate")
+
+        def multi_report():
+            state['next'] += 1
+            process([(f"report-{i}.pdf", pdf) for i, pdf in enumerate(pdfs[:3])], f"benchmark-{state['next']}")
+
+        benches = {
+            'pipeline': (new_report, min(repeat, len(pdfs)) or 1, 1),
+            'duplicate_reupload': (reupload, repeat, 1),
+            'multi_report': (multi_report, max(1, repeat // 5), min(3, len(pdfs))),
+        }
+        results = {}
+        try:
+            process([("report.pdf", pdfs[0])], "benchmark-reupload")
+            for name, (fn, bench_repeat, items) in benches.items():
+                print(f"  macro {name} ...", file=sys.stderr)
+                del traces[:]
+                try:
+                    results[name] = measure(fn, bench_repeat, items=items)
+                except Exception as e:
+                    results[name] = {'error': f"{type(e).__name__}: {e}"}
+                    continue
+                results[name]['stage_p50_seconds'] = stage_percentiles(traces, 50)
+        except Exception as e:
+            results['pipeline'] = {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            scheduler.shutdown()
+            for name, fn in patched.items():
+                setattr(app, name, fn)
+    return results
+
+
+def stage_percentiles(traces, pct):
+    """Per-stage percentile of top-level span wall times across job traces"""
+    walls = {}
+    for rows in traces:
+        for row in rows:
+            if not row.get('nested'):
+                walls.setdefault(row['span'], []).append(row['wall_seconds'])
+    return {name: percentile(values, pct) for name, values in walls.items()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args):
+    stages = set(args.stages) - set(args.skip)
+
+    # Route summarize_text() to the stub before the shared LLM client is created
+    stub = start_stub_llm(delay=args.llm_delay)
+    os.environ["LLM_BASE_URL"] = stub.base_url
+    os.environ.setdefault("TOGETHER_API_KEY", "benchmark-stub")
+    # Per-span JSON logs would swamp the benchmark output
+    trace_logger.setLevel(logging.WARNING)
+
+    try:
+        inputs = build_inputs(args.pages, args.metrics_per_page, args.filler_lines, args.reports)
+        results = {
+            'commit': git_commit(),
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {
+                'pages': args.pages,
+                'metrics_per_page': args.metrics_per_page,
+                'filler_lines': args.filler_lines,
+                'reports': args.reports,
+                'repeat': args.repeat,
+                'llm_delay': args.llm_delay,
+                'stages': sorted(stages),
+                'text_chars': len(inputs['text']),
+                'chunks': len(inputs['chunks']),
+            },
+            'micro': micro_benchmarks(inputs, stages, args.repeat),
+            'macro': {} if args.no_macro else macro_benchmark(inputs, stages, args.repeat),
+            'llm_requests': stub.request_count,
+            'max_rss_bytes': max_rss_bytes(),
+        }
+    finally:
+        stub.stop()
+
+    pipeline = results['macro'].get('pipeline')
+    if pipeline and 'error' not in pipeline and not results['llm_requests']:
+        results['macro']['pipeline'] = {'error': "the stub LLM received no requests"}
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_table(results)
+    print(f"\nSaved {out}")
+    return 1 if any('error' in stats for section in ('micro', 'macro') for stats in results[section].values()) else 0
+
+
+def print_table(results):
+    rows = [(f"micro/{k}", v) for k, v in results['micro'].items()]
+    rows += [(f"macro/{k}", v) for k, v in results['macro'].items()]
+    print(f"{'benchmark':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'items/s':>12}{'peak MB':>10}")
+    for name, stats in rows:
+        if 'error' in stats:
+            print(f"{name:<22}  {stats['error']}")
+            continue
+        print(
+            f"{name:<22}{stats['p50_seconds'] * 1000:>10.2f}{stats['p90_seconds'] * 1000:>10.2f}"
+            f"{stats['p99_seconds'] * 1000:>10.2f}{stats['items_per_second'] or 0:>12.1f}"
+            f"{stats['peak_memory_bytes'] / 1e6:>10.2f}"
+        )
+
+
+def compare(old_path, new_path, threshold):
+    """Print p50 changes between two result files; returns 1 if any regressed past threshold"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    regressed = False
+    print(f"{'benchmark':<22}{old['commit']:>12}{new['commit']:>12}{'change':>10}")
+    for section in ('micro', 'macro'):
+        for name, stats in new.get(section, {}).items():
+            before = old.get(section, {}).get(name)
+            if not before or 'error' in before or 'error' in stats:
+                continue
+            change = (stats['p50_seconds'] - before['p50_seconds']) / before['p50_seconds']
+            flag = "  REGRESSION" if change > threshold else ""
+            regressed = regressed or bool(flag)
+            print(
+                f"{section + '/' + name:<22}{before['p50_seconds'] * 1000:>10.2f}ms"
+                f"{stats['p50_seconds'] * 1000:>10.2f}ms{change:>+10.1%}{flag}"
+            )
+    return 1 if regressed else 0
+
+
+ALL_STAGES = ['extraction', 'chunking', 'embedding', 'parse', 'risk', 'trends', 'pdf_export']
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'compare':
+        parser = argparse.ArgumentParser(prog="benchmarks.run compare")
+        parser.add_argument('old')
+        parser.add_argument('new')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help="Relative p50 slowdown that counts as a regression")
+        args = parser.parse_args(argv[1:])
+        return compare(args.old, args.new, args.threshold)
+
+    parser = argparse.ArgumentParser(description="Benchmark the report processing pipeline")
+    parser.add_argument('--stages', nargs='+', default=ALL_STAGES, choices=ALL_STAGES)
+    parser.add_argument('--skip', nargs='+', default=[], choices=ALL_STAGES)
+    parser.add_argument('--pages', type=int, default=2)
+    parser.add_argument('--metrics-per-page', type=int, default=8)
+    parser.add_argument('--filler-lines', type=int, default=20)
+    parser.add_argument('--reports', type=int, default=10, help="Reports in the synthetic corpus")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--llm-delay', type=float, default=0.0, help="Stub LLM latency in seconds")
+    parser.add_argument('--no-macro', action='store_true')
+    parser.add_argument('--out', help="Result file (default: benchmarks/results/<commit>.json)")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+# stub_llm.py
+"""Deterministic stand-in for the Together endpoint used by the benchmarks.
+
+The stub reads lab lines such as ``Hemoglobin: 13.2 g/dL (Ref: 12-16) Normal``
+out of the prompt and answers with a fixed-format summary plus the JSON metrics
+array that `parse_llm_summary` expects, so the downstream stages see realistic
+input without network calls.
+"""
+import json
+import re
+
+from llm.fake_server import FakeOpenAIServer
+
+LAB_LINE = re.compile(
+    r"^(?P<metric>[A-Za-z][A-Za-z0-9 ]*?):\s*(?P<value>-?\d+(?:\.\d+)?)\s*(?P<unit>\S+)\s*"
+    r"\(Ref:\s*(?P<range>[\d.]+-[\d.]+)\)\s*(?P<status>Low|Normal|High)?",
+    re.MULTILINE,
+)
+PATIENT_LINE = re.compile(r"Patient Name:\s*(?P<name>.+?)\s{2,}Report Date:\s*(?P<date>\S+)")
+
+
+def stub_summary(prompt):
+    """Deterministic summary for a summarization prompt"""
+    metrics = [
+        {
+            'metric': match['metric'].strip(),
+            'value': float(match['value']),
+            'reference_range': match['range'],
+            'unit': match['unit'],
+            'status': match['status'] or 'Normal',
+        }
+        for match in LAB_LINE.finditer(prompt)
+    ]
+    patient = PATIENT_LINE.search(prompt)
+    abnormal = [m['metric'] for m in metrics if m['status'] != 'Normal']
+    return "\n".join([
+        f"Patient's name: {patient['name'] if patient else 'Not available'}",
+        f"Date of the report: {patient['date'] if patient else 'Not available'}",
+        "Key findings:",
+        f"- {len(metrics)} tests reported, {len(abnormal)} outside the reference range",
+        *[f"- {name} is out of range" for name in abnormal],
+        "Recommendations:",
+        "- Repeat abnormal tests in 3 months",
+        json.dumps(metrics),
+    ])
+
+
+def stub_responder(messages):
+    return stub_summary(messages[-1]['content'] if messages else "")
+
+
+def start_stub_llm(delay=0.0, port=0):
+    """Start the stub on a free local port; caller must `.stop()` it"""
+    return FakeOpenAIServer(port=port, delay=delay, responder=stub_responder).start()
@@ -0,0 +1,126 @@
+# synthetic.py
+"""Deterministic synthetic lab-report PDFs for benchmarks.
+
+``python -m benchmarks.synthetic --out corpus/ --reports 50 --pages 3`` writes
+a corpus of reports plus a ``manifest.json`` with the expected metrics.
+"""
+import argparse
+import json
+import os
+import random
+
+# (metric, unit, reference low, reference high)
+LAB_PANEL = [
+    ('Hemoglobin', 'g/dL', 12.0, 16.0),
+    ('RBC', 'million/uL', 4.2, 5.9),
+    ('MCV', 'fL', 80.0, 100.0),
+    ('WBC', 'thousand/uL', 4.0, 11.0),
+    ('Platelets', 'thousand/uL', 150.0, 450.0),
+    ('Glucose', 'mg/dL', 70.0, 100.0),
+    ('HbA1c', '%', 4.0, 5.6),
+    ('BMI', 'kg/m2', 18.5, 24.9),
+    ('TSH', 'mIU/L', 0.4, 4.0),
+    ('Creatinine', 'mg/dL', 0.6, 1.2),
+    ('ALT', 'U/L', 7.0, 56.0),
+    ('AST', 'U/L', 10.0, 40.0),
+    ('Cholesterol', 'mg/dL', 125.0, 200.0),
+    ('LDL', 'mg/dL', 0.0, 100.0),
+    ('HDL', 'mg/dL', 40.0, 60.0),
+    ('Triglycerides', 'mg/dL', 0.0, 150.0),
+    ('Sodium', 'mmol/L', 135.0, 145.0),
+    ('Potassium', 'mmol/L', 3.5, 5.0),
+    ('Vitamin D', 'ng/mL', 20.0, 50.0),
+    ('Ferritin', 'ng/mL', 20.0, 250.0),
+]
+
+FILLER_SENTENCES = [
+    "Patient reports mild fatigue over the past month.",
+    "No history of recent travel or infection was reported.",
+    "Sample was collected after an overnight fast.",
+    "Previous results are available for comparison in the chart.",
+    "Physical examination was unremarkable apart from mild pallor.",
+    "Current medication includes a daily multivitamin.",
+    "Follow-up testing is advised if symptoms persist.",
+    "Family history is notable for type 2 diabetes.",
+]
+
+
+def generate_metrics(rng, count):
+    """Pick `count` lab tests and draw values around (and sometimes outside) the range"""
+    metrics = []
+    for metric, unit, low, high in rng.sample(LAB_PANEL, min(count, len(LAB_PANEL))):
+        span = high - low
+        value = round(rng.uniform(low - 0.3 * span, high + 0.3 * span), 1)
+        status = 'Low' if value < low else 'High' if value > high else 'Normal'
+        metrics.append({
+            'metric': metric,
+            'value': value,
+            'reference_range': f"{low:g}-{high:g}",
+            'unit': unit,
+            'status': status,
+        })
+    return metrics
+
+
+def generate_report(seed=0, pages=1, metrics_per_page=8, filler_lines=10, patient=None):
+    """Build one report; returns (pdf_bytes, {'patient', 'date', 'metrics'})"""
+    from fpdf import FPDF
+
+    rng = random.Random(seed)
+    patient = patient or f"Patient {seed:05d}"
+    date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    pdf = FPDF()
+    pdf.set_font("Arial", size=11)
+    all_metrics = []
+    for page in range(pages):
+        pdf.add_page()
+        pdf.cell(0, 8, txt="City Diagnostics Laboratory - Test Report", ln=1)
+        pdf.cell(0, 8, txt=f"Patient Name: {patient}    Report Date: {date}    Page {page + 1}/{pages}", ln=1)
+        pdf.ln(2)
+
+        metrics = generate_metrics(rng, metrics_per_page)
+        for item in metrics:
+            pdf.cell(0, 7, txt=(
+                f"{item['metric']}: {item['value']} {item['unit']} "
+                f"(Ref: {item['reference_range']}) {item['status']}"
+            ), ln=1)
+        all_metrics.extend(metrics)
+
+        pdf.ln(2)
+        for _ in range(filler_lines):
+            pdf.multi_cell(0, 6, txt=rng.choice(FILLER_SENTENCES))
+
+    pdf_bytes = pdf.output(dest='S').encode('latin1')
+    return pdf_bytes, {'patient': patient, 'date': date, 'metrics': all_metrics}
+
+
+def generate_corpus(out_dir, reports=10, pages=1, metrics_per_page=8, filler_lines=10, seed=0):
+    """Write `reports` PDFs and a manifest into out_dir; returns the manifest"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = []
+    for i in range(reports):
+        pdf_bytes, expected = generate_report(seed + i, pages, metrics_per_page, filler_lines)
+        filename = f"report_{i:05d}.pdf"
+        with open(os.path.join(out_dir, filename), 'wb') as f:
+            f.write(pdf_bytes)
+        manifest.append({'file': filename, **expected})
+
+    with open(os.path.join(out_dir, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic lab-report PDFs")
+    parser.add_argument('--out', default="benchmarks/corpus")
+    parser.add_argument('--reports', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=1)
+    parser.add_argument('--metrics-per-page', type=int, default=8)
+    parser.add_argument('--filler-lines', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.out, args.reports, args.pages, args.metrics_per_page,
+                               args.filler_lines, args.seed)
+    print(f"Wrote {len(manifest)} reports to {args.out}")
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import json
 import re
 
@@ -42,6 +41,8 @@ def display_metric_summary(metrics_data):
         st.warning("⚠️ No health metrics found")
         return
     
+    import pandas as pd
+
     df = pd.DataFrame(metrics_data)
     
     # Convert numeric values
@@ -81,6 +82,8 @@ def predict_conditions(metrics_data):
 def download_metrics(metrics_data):
     """Generate downloadable CSV report"""
     if metrics_data:
+        import pandas as pd
+
         df = pd.DataFrame(metrics_data)
         csv = df.to_csv(index=False).encode('utf-8')
         st.download_button(
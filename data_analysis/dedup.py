@@ -0,0 +1,224 @@
+# dedup.py
+"""Near-duplicate report detection with MinHash signatures and LSH banding.
+
+Re-scans and re-exports of the same report differ only in whitespace, OCR noise
+or a header line, so their word-shingle Jaccard similarity stays high. The
+index lives in SQLite next to the job store, so duplicates are recognised
+across restarts before any LLM or embedding work is done.
+
+Similarity alone is not enough for lab reports: the same template with another
+patient's name or one changed value still scores above 0.95. A match therefore
+also needs an identical content fingerprint (every number and identifier plus
+the patient-particulars lines) and the same scope (patient or session), so one
+patient's results are never reused for another.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from perf.tracing import registry
+
+DEDUP_INDEX_PATH = os.getenv(
+    "DEDUP_INDEX_PATH", os.path.join(os.getenv("JOB_STORE_DIR", "job_store"), "dedup.sqlite3")
+)
+DEFAULT_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.9))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS signatures (
+        doc_id TEXT PRIMARY KEY,
+        signature BLOB NOT NULL,
+        fingerprint TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS bands (
+        band INTEGER NOT NULL,
+        bucket TEXT NOT NULL,
+        doc_id TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, bucket)",
+    """CREATE TABLE IF NOT EXISTS stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )""",
+]
+
+
+# Numbers, dates and IDs such as "10.2", "20/06/2015" or "S1111111X"
+_DIGIT_TOKEN = re.compile(r"[A-Za-z0-9]*\d[A-Za-z0-9]*(?:[.,/:-]\d+)*")
+# "Full name of patient: ...", "NRIC/FIN/Passport no.: ...", "Age: ...", "DOB: ..."
+_PARTICULARS_LINE = re.compile(
+    r"^[^:\n]*\b(?:name|patient|nric|fin|passport|mrn|dob|birth|age|sex|gender|id)\b[^:\n]*:.*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def fingerprint(text):
+    """Hash of what must match exactly before a report's results may be reused"""
+    digest = hashlib.blake2b(digest_size=16)
+    for token in _DIGIT_TOKEN.findall(text):
+        digest.update(token.encode("utf-8") + b"\x1f")
+    digest.update(b"\x1e")
+    for line in _PARTICULARS_LINE.findall(text):
+        digest.update(re.sub(r"\s+", " ", line).strip().lower().encode("utf-8") + b"\x1f")
+    return digest.hexdigest()
+
+
+def shingles(text, size=3):
+    """Set of hashed word n-grams of the normalised text"""
+    words = re.sub(r"\s+", " ", text.lower()).strip().split(" ")
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + size]).encode("utf-8"), digest_size=4).digest(), "little")
+        for i in range(len(words) - size + 1)
+    }
+
+
+class MinHasher:
+    """MinHash signatures using universal hashing (a * x + b) mod p"""
+
+    def __init__(self, num_perm=128, shingle_size=3, seed=1):
+        import numpy as np
+
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        import numpy as np
+
+        hashes = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        # a, x < 2**32 so a * x fits in uint64; reduce before adding b to avoid overflow
+        values = (np.outer(hashes, self._a) % _MERSENNE_PRIME + self._b) % _MERSENNE_PRIME
+        return (values & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """Estimated Jaccard similarity of two signatures"""
+        return float((sig_a == sig_b).mean())
+
+
+class NearDuplicateIndex:
+    """On-disk LSH index mapping document ids (job ids) to MinHash signatures"""
+
+    def __init__(self, path=DEDUP_INDEX_PATH, threshold=DEFAULT_THRESHOLD, num_perm=128, bands=32):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _buckets(self, signature):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, hashlib.blake2b(chunk.tobytes(), digest_size=8).hexdigest()
+
+    def signature(self, text):
+        return self.hasher.signature(text)
+
+    def find(self, signature, fingerprint, scope):
+        """Best earlier document in `scope` with the same fingerprint and a similarity
+        at or above the threshold: (doc_id, similarity) or None"""
+        import numpy as np
+
+        with self._lock, self._connect() as conn:
+            candidates = set()
+            for band, bucket in self._buckets(signature):
+                rows = conn.execute(
+                    "SELECT doc_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)
+                ).fetchall()
+                candidates.update(doc_id for (doc_id,) in rows)
+
+            best = None
+            for doc_id in candidates:
+                row = conn.execute(
+                    "SELECT signature FROM signatures WHERE doc_id = ? AND fingerprint = ? AND scope = ?",
+                    (doc_id, fingerprint, scope),
+                ).fetchone()
+                if row is None:
+                    continue
+                score = MinHasher.similarity(signature, np.frombuffer(row[0], dtype=np.uint32))
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (doc_id, score)
+
+            self._bump(conn, 'lookups')
+            if best:
+                self._bump(conn, 'duplicates')
+        return best
+
+    def add(self, doc_id, signature, fingerprint, scope):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures (doc_id, signature, fingerprint, scope, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (doc_id, signature.tobytes(), fingerprint, scope, time.time()),
+            )
+            conn.execute("DELETE FROM bands WHERE doc_id = ?", (doc_id,))
+            conn.executemany(
+                "INSERT INTO bands (band, bucket, doc_id) VALUES (?, ?, ?)",
+                [(band, bucket, doc_id) for band, bucket in self._buckets(signature)],
+            )
+
+    def remove(self, doc_id):
+        """Forget a document, e.g. when its stored results are no longer available"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM signatures WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM bands WHERE doc_id = ?", (doc_id,))
+
+    @staticmethod
+    def _bump(conn, name):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def stats(self):
+        with self._connect() as conn:
+            values = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            indexed = conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        lookups = values.get('lookups', 0)
+        duplicates = values.get('duplicates', 0)
+        return {
+            'indexed_reports': indexed,
+            'lookups': lookups,
+            'duplicates': duplicates,
+            'duplicate_rate': duplicates / lookups if lookups else 0.0,
+            'threshold': self.threshold,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index():
+    """Process-wide near-duplicate index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex()
+            registry.register_gauges("dedup", _index.stats)
+        return _index
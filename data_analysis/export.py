@@ -0,0 +1,279 @@
+# export.py
+"""Bulk export of parsed metrics and risk scores across many processed reports.
+
+Reads finished jobs from the job store one at a time and writes one row per
+metric in fixed-size batches, so memory stays bounded regardless of cohort
+size. Parquet (one row group per batch, needs pyarrow) or gzip-compressed CSV.
+
+    python -m data_analysis.export --out cohort.parquet
+    python -m data_analysis.export --out cohort.csv.gz --format csv --incremental
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import pickle
+import re
+import sqlite3
+import time
+
+from perf.tracing import span
+
+EXPORT_COLUMNS = [
+    ('job_id', 'string'),
+    ('finished_at', 'float64'),
+    ('files', 'string'),
+    ('metric', 'string'),
+    ('value', 'float64'),
+    ('unit', 'string'),
+    ('value_normalized', 'float64'),
+    ('unit_normalized', 'string'),
+    ('reference_low', 'float64'),
+    ('reference_high', 'float64'),
+    ('reference_low_normalized', 'float64'),
+    ('reference_high_normalized', 'float64'),
+    ('status', 'string'),
+    ('anomaly', 'bool'),
+    ('anemia_probability', 'float64'),
+]
+
+# (metric, unit) -> (canonical unit, factor); metric None matches any metric
+UNIT_CONVERSIONS = {
+    ('glucose', 'mmol/l'): ('mg/dL', 18.016),
+    ('cholesterol', 'mmol/l'): ('mg/dL', 38.67),
+    ('ldl', 'mmol/l'): ('mg/dL', 38.67),
+    ('hdl', 'mmol/l'): ('mg/dL', 38.67),
+    ('triglycerides', 'mmol/l'): ('mg/dL', 88.57),
+    ('creatinine', 'umol/l'): ('mg/dL', 1 / 88.4),
+    ('creatinine', 'µmol/l'): ('mg/dL', 1 / 88.4),
+    ('hba1c', 'mmol/mol'): ('%', None),
+    (None, 'g/l'): ('g/dL', 0.1),
+    (None, 'mg/l'): ('mg/dL', 0.1),
+    (None, '10^9/l'): ('thousand/uL', 1.0),
+    (None, '10^12/l'): ('million/uL', 1.0),
+}
+
+
+def to_float(value):
+    try:
+        return float(str(value).replace(',', '').strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reference_range(reference_range):
+    """'12-16' -> (12.0, 16.0); anything else -> (None, None)"""
+    match = re.match(r"^\s*(-?[\d.]+)\s*-\s*(-?[\d.]+)\s*$", str(reference_range))
+    if not match:
+        return None, None
+    return to_float(match.group(1)), to_float(match.group(2))
+
+
+def normalize_unit(metric, value, unit):
+    """Convert a value to the canonical unit for its metric"""
+    unit_key = str(unit or '').strip().lower()
+    conversion = UNIT_CONVERSIONS.get((str(metric).lower(), unit_key)) or UNIT_CONVERSIONS.get((None, unit_key))
+    if value is None or conversion is None:
+        return value, unit
+    canonical, factor = conversion
+    if factor is None:
+        # HbA1c IFCC (mmol/mol) -> NGSP (%)
+        return round(value * 0.0915 + 2.15, 2), canonical
+    return round(value * factor, 4), canonical
+
+
+def report_rows(job_id, finished_at, result):
+    """One export row per metric of a finished job's result"""
+    risk = result.get('risk_assessment') or {}
+    anemia = (risk.get('anemia') or {}).get('probability')
+    files = ", ".join(result.get('filenames', []))
+
+    for item in result.get('parsed_data') or []:
+        value = to_float(item.get('value'))
+        low, high = parse_reference_range(item.get('reference_range'))
+        value_normalized, unit_normalized = normalize_unit(item.get('metric'), value, item.get('unit'))
+        # Bounds share the value's unit, so they get the same conversion
+        low_normalized = normalize_unit(item.get('metric'), low, item.get('unit'))[0]
+        high_normalized = normalize_unit(item.get('metric'), high, item.get('unit'))[0]
+        out_of_range = value_normalized is not None and (
+            (low_normalized is not None and value_normalized < low_normalized)
+            or (high_normalized is not None and value_normalized > high_normalized)
+        )
+        yield {
+            'job_id': job_id,
+            'finished_at': finished_at,
+            'files': files,
+            'metric': str(item.get('metric')),
+            'value': value,
+            'unit': str(item.get('unit')),
+            'value_normalized': value_normalized,
+            'unit_normalized': str(unit_normalized),
+            'reference_low': low,
+            'reference_high': high,
+            'reference_low_normalized': low_normalized,
+            'reference_high_normalized': high_normalized,
+            'status': str(item.get('status')),
+            'anomaly': bool(out_of_range or str(item.get('status')).lower() in ('low', 'high')),
+            'anemia_probability': float(anemia) if anemia is not None else None,
+        }
+
+
+def iter_finished_jobs(db_path, watermark=None):
+    """Yield (job_id, finished_at, result) for finished jobs after the watermark, oldest first
+
+    Includes jobs that reused an earlier report's result (`duplicate_of`);
+    callers decide whether to count them.
+    """
+    since = (watermark or {}).get('finished_at', -1.0)
+    since_id = (watermark or {}).get('job_id', '')
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        # Iterating the cursor streams rows instead of loading every result at once
+        cursor = conn.execute(
+            "SELECT id, finished_at, result FROM jobs "
+            "WHERE status = 'done' AND (finished_at > ? OR (finished_at = ? AND id > ?)) "
+            "ORDER BY finished_at, id",
+            (since, since, since_id),
+        )
+        for job_id, finished_at, blob in cursor:
+            if blob is not None:
+                yield job_id, finished_at, pickle.loads(blob)
+    finally:
+        conn.close()
+
+
+class ParquetBatchWriter:
+    """Writes each batch as one Parquet row group"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow (or use --format csv)")
+
+        self._pa = pa
+        # pyarrow names the boolean type `bool_`, so map column kinds explicitly
+        types = {'string': pa.string(), 'float64': pa.float64(), 'bool': pa.bool_()}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write_batch(self, rows):
+        columns = {name: [row[name] for row in rows] for name, _ in EXPORT_COLUMNS}
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class CsvGzipWriter:
+    """Streams rows to CSV, gzip-compressed when the path ends in .gz"""
+
+    def __init__(self, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        self._file = opener(path, 'wt', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=[name for name, _ in EXPORT_COLUMNS])
+        self._writer.writeheader()
+
+    def write_batch(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+def load_watermark(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def save_watermark(path, watermark):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(watermark, f)
+    os.replace(tmp_path, path)
+
+
+def incremental_path(out_path, stamp=None):
+    """`cohort.csv.gz` -> `cohort-20240101T120000.csv.gz`, so each delta gets its own file"""
+    stamp = stamp or time.strftime("%Y%m%dT%H%M%S")
+    match = re.search(r"(\.csv\.gz|\.[^./\\]+)$", out_path)
+    stem, suffix = (out_path[:match.start()], match.group(1)) if match else (out_path, "")
+    return f"{stem}-{stamp}{suffix}"
+
+
+def export_reports(db_path, out_path, fmt='parquet', batch_size=50_000, watermark_path=None):
+    """Export all (or, with a watermark file, only new) finished reports; returns stats"""
+    if watermark_path and os.path.exists(out_path):
+        # The previous delta is only in that file; the watermark has already moved past it
+        raise FileExistsError(f"{out_path} already exists; incremental exports never overwrite")
+    watermark = load_watermark(watermark_path)
+    writer = ParquetBatchWriter(out_path) if fmt == 'parquet' else CsvGzipWriter(out_path)
+
+    rows_written = reports = duplicates = 0
+    last = watermark
+    batch = []
+    start = time.perf_counter()
+    with span("bulk_export", format=fmt) as stage:
+        try:
+            for job_id, finished_at, result in iter_finished_jobs(db_path, watermark):
+                last = {'finished_at': finished_at, 'job_id': job_id}
+                if result.get('duplicate_of'):
+                    # A re-upload's rows are the original job's rows; exporting them again double-counts
+                    duplicates += 1
+                    continue
+                reports += 1
+                batch.extend(report_rows(job_id, finished_at, result))
+                if len(batch) >= batch_size:
+                    writer.write_batch(batch)
+                    rows_written += len(batch)
+                    batch = []
+            if batch:
+                writer.write_batch(batch)
+                rows_written += len(batch)
+        finally:
+            writer.close()
+        stage.items = rows_written
+
+    # Only advance the watermark once the export file is complete
+    if watermark_path and last:
+        save_watermark(watermark_path, last)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'reports': reports,
+        'duplicates_skipped': duplicates,
+        'rows': rows_written,
+        'seconds': elapsed,
+        'rows_per_second': rows_written / elapsed if elapsed > 0 else 0.0,
+        'watermark': last,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export metrics and risk scores for processed reports")
+    parser.add_argument('--out', required=True, help="Output file (.parquet, .csv or .csv.gz)")
+    parser.add_argument('--format', choices=['parquet', 'csv'], default=None,
+                        help="Defaults to csv for .csv/.csv.gz paths, parquet otherwise")
+    parser.add_argument('--db', default=os.path.join(os.getenv("JOB_STORE_DIR", "job_store"), "jobs.sqlite3"))
+    parser.add_argument('--batch-size', type=int, default=50_000, help="Rows per batch / row group")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only export reports finished since the last incremental export, "
+                             "to a new timestamped file next to --out")
+    parser.add_argument('--watermark', default=None,
+                        help="Watermark file (default: <out>.watermark.json with --incremental)")
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if re.search(r"\.csv(\.gz)?$", args.out) else 'parquet')
+    incremental = args.incremental or args.watermark is not None
+    watermark_path = args.watermark or (f"{args.out}.watermark.json" if incremental else None)
+    out_path = incremental_path(args.out) if incremental else args.out
+    stats = export_reports(args.db, out_path, fmt, args.batch_size, watermark_path)
+    print(
+        f"Exported {stats['rows']} rows from {stats['reports']} reports "
+        f"({stats['duplicates_skipped']} re-uploads skipped) in {stats['seconds']:.2f}s "
+        f"({stats['rows_per_second']:.0f} rows/s) -> {out_path}"
+    )
@@ -1,7 +1,4 @@
 # predictive.py
-import joblib
-""" Used to load saved machine learning models (.pkl files)."""
-import numpy as np
 import streamlit as st
 import os
 
@@ -22,6 +19,9 @@ class DiseasePredictor:
         """Load model with proper path handling and error reporting"""
         model_path = os.path.join(self.model_dir, model_filename)
         try:
+            # joblib pulls in scikit-learn on unpickling; only pay for it when predicting
+            import joblib
+
             return joblib.load(model_path)
         except Exception as e:
             st.error(f"Error loading model {model_path}: {str(e)}")
@@ -30,6 +30,8 @@ class DiseasePredictor:
 
     def _get_features(self, metrics, disease):
         """Case-insensitive feature extraction with numeric validation"""
+        import numpy as np
+
         # Convert metrics to lowercase keys for case-insensitive matching
         metrics_lower = {k.lower(): v for k, v in metrics.items()}
         features = []
@@ -1,6 +1,4 @@
-import numpy as np
 import uuid
-from langchain_community.vectorstores import FAISS
 
 class ReportComparator:
     def __init__(self, vectorstore):
@@ -8,19 +6,36 @@ class ReportComparator:
         self.vectorstore = vectorstore
 
     def find_similar_reports(self, embedding, k=5):
-        """Find similar reports using FAISS built-in methods"""
+        """Earlier reports whose chunks are closest to `embedding`.
+
+        Returns [(metadata, cosine similarity)], one entry per report (chunks
+        grouped by their `job_id` metadata), most similar first.
+        """
+        import numpy as np
+
         try:
-            # Convert to numpy array
-            query_embedding = np.array(embedding, dtype=np.float32)
-            
-            # Use FAISS's native similarity search
-            docs_and_scores = self.vectorstore.similarity_search_by_vector(
-                query_embedding.flatten().tolist(), 
-                k=k
-            )
-            
-            return [(doc.metadata, 1) for doc, _ in docs_and_scores]  # 1 = max similarity
-            
+            index = self.vectorstore.index
+            if index.ntotal == 0:
+                return []
+            query_embedding = np.array(embedding, dtype=np.float32).reshape(1, -1)
+            _, ids = index.search(query_embedding, min(k, index.ntotal))
+
+            best = {}
+            query_norm = np.linalg.norm(query_embedding[0])
+            for i in ids[0]:
+                if i == -1:
+                    continue
+                vector = index.reconstruct(int(i))
+                denominator = query_norm * np.linalg.norm(vector)
+                score = max(0.0, float(np.dot(query_embedding[0], vector) / denominator)) if denominator else 0.0
+                doc = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[int(i)])
+                metadata = getattr(doc, 'metadata', None) or {}
+                key = metadata.get('job_id')
+                if key not in best or score > best[key][1]:
+                    best[key] = (metadata, score)
+
+            return sorted(best.values(), key=lambda item: item[1], reverse=True)
+
         except Exception as e:
             print(f"Similarity search error: {str(e)}")
             return []
@@ -1,6 +1,4 @@
 # trends.py
-import pandas as pd
-import plotly.express as px
 import streamlit as st
 
 def plot_metric_trend(historical_df, metric, date_col='date'):
@@ -15,6 +13,8 @@ def plot_metric_trend(historical_df, metric, date_col='date'):
         st.warning(f"Metric '{metric}' or date column '{date_col}' not found in data.")
         return
 
+    import plotly.express as px
+
     df = historical_df[[date_col, metric]].dropna()
     df = df.sort_values(date_col)
     fig = px.line(df, x=date_col, y=metric, markers=True,
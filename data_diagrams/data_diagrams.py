@@ -1,13 +1,12 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from io import BytesIO
 
 def plot_metric_comparison(metrics_df, silent=False):
     """Interactive bar chart with reference ranges. Returns fig if silent=True."""
     if metrics_df.empty:
         return None
 
+    import plotly.express as px
+
     fig = px.bar(
         metrics_df,
         x='metric',
@@ -52,6 +51,8 @@ def generate_radial_health_score(metrics_df):
     if metrics_df.empty:
         return
 
+    import plotly.express as px
+
     normalized_df = metrics_df.copy()
     normalized_df['score'] = 0.0
 
@@ -140,6 +141,8 @@ def plot_historical_trend(historical_data):
     if not historical_data:
         return
 
+    import plotly.express as px
+
     fig = px.line(
         historical_data,
         x='date',
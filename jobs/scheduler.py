@@ -0,0 +1,193 @@
+# scheduler.py
+"""Background job queue for report processing.
+
+Jobs run on a thread pool so a slow LLM call never blocks the Streamlit script
+thread. Status, per-stage progress and results are persisted in SQLite by job
+id, so any rerun (or another session) can poll and render them without
+recomputing. Objects that cannot be pickled (e.g. a FAISS index) are written
+under `job.path()` and loaded from there by whoever needs them, so the
+scheduler holds no memory for finished jobs.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from perf.tracing import memory_tracing, registry, trace_run
+
+JOB_STORE_DIR = os.getenv("JOB_STORE_DIR", "job_store")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    result BLOB
+)
+"""
+
+
+class JobContext:
+    """Handle passed to a running job for progress reporting and storage"""
+
+    def __init__(self, scheduler, job_id):
+        self.scheduler = scheduler
+        self.job_id = job_id
+
+    def progress(self, stage, fraction):
+        """Record the current stage and overall completion (0.0 - 1.0)"""
+        self.scheduler._update(self.job_id, stage=stage, progress=max(0.0, min(1.0, fraction)))
+
+    def path(self, name=""):
+        """Directory for this job's on-disk artifacts"""
+        directory = os.path.join(self.scheduler.store_dir, self.job_id)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name) if name else directory
+
+
+class JobScheduler:
+    """Thread-pool worker queue with a SQLite-backed job table"""
+
+    def __init__(self, store_dir=JOB_STORE_DIR, workers=None):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.db_path = os.path.join(store_dir, "jobs.sqlite3")
+        self.workers = workers or int(os.getenv("JOB_WORKERS", 2))
+        if memory_tracing():
+            # Peak memory is process-wide; with concurrent jobs each span would include the others'
+            self.workers = 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._busy_seconds = 0.0
+        self._started = time.monotonic()
+        self._completed = 0
+        self._failed = 0
+
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            # Jobs that were in flight when the process died will never finish
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+                (FAILED, "Interrupted by server restart", time.time(), QUEUED, RUNNING),
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._db_lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def submit(self, fn, *args, kind="report", job_id=None, **kwargs):
+        """Queue `fn(job, *args, **kwargs)`; its return value becomes the job result"""
+        job_id = job_id or uuid.uuid4().hex
+        with self._db_lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, stage, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, "queued", time.time()),
+            )
+        with self._lock:
+            self._queued += 1
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        start = time.monotonic()
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        try:
+            with trace_run(run_id=job_id) as run:
+                result = fn(JobContext(self, job_id), *args, **kwargs)
+            if isinstance(result, dict):
+                result.setdefault('trace', run.to_rows())
+            self._update(
+                job_id,
+                status=DONE,
+                stage="done",
+                progress=1.0,
+                finished_at=time.time(),
+                result=pickle.dumps(result),
+            )
+            outcome = '_completed'
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, error=str(e) or type(e).__name__, finished_at=time.time())
+            outcome = '_failed'
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._busy_seconds += time.monotonic() - start
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def status(self, job_id):
+        """Job row without the result payload, or None for an unknown id"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, stage, progress, created_at, started_at, finished_at, error "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def result(self, job_id):
+        """Unpickled result of a finished job, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM jobs WHERE id = ? AND status = ?", (job_id, DONE)
+            ).fetchone()
+        return pickle.loads(row['result']) if row and row['result'] is not None else None
+
+    def metrics(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return {
+                'workers': self.workers,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'completed': self._completed,
+                'failed': self._failed,
+                'utilization': (
+                    self._busy_seconds / (elapsed * self.workers) if elapsed > 0 else 0.0
+                ),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by every Streamlit session"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+            registry.register_gauges("jobs", _scheduler.metrics)
+        return _scheduler
@@ -0,0 +1,275 @@
+# client.py
+"""Process-wide LLM client shared by every Streamlit session."""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import httpx
+
+from perf.tracing import registry
+
+DEFAULT_BASE_URL = "https://api.together.xyz/v1"
+DEFAULT_MODEL = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def load_settings():
+    """Read pool, concurrency and timeout settings from the environment"""
+    return {
+        'base_url': os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL),
+        'model': os.getenv("LLM_MODEL", DEFAULT_MODEL),
+        'max_connections': _env_int("LLM_MAX_CONNECTIONS", 20),
+        'max_keepalive_connections': _env_int("LLM_MAX_KEEPALIVE", 10),
+        'keepalive_expiry': _env_float("LLM_KEEPALIVE_EXPIRY", 30.0),
+        'max_concurrency': _env_int("LLM_MAX_CONCURRENCY", 8),
+        'connect_timeout': _env_float("LLM_CONNECT_TIMEOUT", 10.0),
+        'read_timeout': _env_float("LLM_READ_TIMEOUT", 120.0),
+        'max_retries': _env_int("LLM_MAX_RETRIES", 2),
+    }
+
+
+class ConcurrencyLimiter:
+    """Global cap on upstream requests, with queue statistics"""
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            self._semaphore.acquire()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        with self._lock:
+            self.active += 1
+            self.total_wait_seconds += time.perf_counter() - start
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+        self._semaphore.release()
+        return False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'completed': self.completed,
+                'avg_wait_seconds': (
+                    self.total_wait_seconds / self.completed if self.completed else 0.0
+                ),
+            }
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """httpx transport that holds a limiter slot for the whole request"""
+
+    def __init__(self, transport, limiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    def handle_request(self, request):
+        with self._limiter:
+            response = self._transport.handle_request(request)
+            # Read the body while holding the slot so the limit covers the full call
+            response.read()
+            return response
+
+    def close(self):
+        self._transport.close()
+
+    def pool_snapshot(self):
+        """Connection counts from the underlying httpcore pool, when available"""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)())
+        return {'open': len(connections), 'idle': idle, 'busy': len(connections) - idle}
+
+
+class RequestCoalescer:
+    """Share one upstream call between identical prompts that are in flight"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def run(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._inflight),
+                'upstream_calls': self.leaders,
+                'coalesced': self.coalesced,
+            }
+
+
+class LLMClient:
+    """Pooled HTTP client, concurrency limit and coalescing around ChatOpenAI"""
+
+    def __init__(self, api_key, settings=None):
+        import openai
+        from langchain_community.chat_models import ChatOpenAI
+
+        self.settings = settings or load_settings()
+        self.limiter = ConcurrencyLimiter(self.settings['max_concurrency'])
+        self.coalescer = RequestCoalescer()
+        limits = httpx.Limits(
+            max_connections=self.settings['max_connections'],
+            max_keepalive_connections=self.settings['max_keepalive_connections'],
+            keepalive_expiry=self.settings['keepalive_expiry'],
+        )
+        self.transport = LimitedTransport(httpx.HTTPTransport(limits=limits), self.limiter)
+        timeout = httpx.Timeout(
+            self.settings['read_timeout'],
+            connect=self.settings['connect_timeout'],
+        )
+        self.http_client = httpx.Client(transport=self.transport, timeout=timeout)
+        # Only LangChain's async code paths use this; the app itself calls the sync client
+        self.async_http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        # ChatOpenAI would hand a single `http_client` to both OpenAI and AsyncOpenAI,
+        # which rejects a sync client, so both SDK clients are built here instead
+        client_options = {
+            'api_key': api_key,
+            'base_url': self.settings['base_url'],
+            'timeout': timeout,
+            'max_retries': self.settings['max_retries'],
+        }
+        sync_client = openai.OpenAI(http_client=self.http_client, **client_options)
+        async_client = openai.AsyncOpenAI(http_client=self.async_http_client, **client_options)
+        self.llm = ChatOpenAI(
+            client=sync_client.chat.completions,
+            async_client=async_client.chat.completions,
+            base_url=self.settings['base_url'],
+            api_key=api_key,
+            model=self.settings['model'],
+            request_timeout=timeout,
+            max_retries=self.settings['max_retries'],
+        )
+
+    def complete(self, prompt):
+        """Run a single prompt, sharing the call with identical in-flight prompts"""
+        key = hashlib.sha256(
+            f"{self.settings['model']}\x00{prompt}".encode('utf-8')
+        ).hexdigest()
+        return self.coalescer.run(key, lambda: self.llm.predict(prompt))
+
+    def metrics(self):
+        return {
+            'pool': {
+                'max_connections': self.settings['max_connections'],
+                'max_keepalive_connections': self.settings['max_keepalive_connections'],
+                **self.transport.pool_snapshot(),
+            },
+            'queue': self.limiter.snapshot(),
+            'coalescing': self.coalescer.snapshot(),
+        }
+
+    def close(self):
+        self.http_client.close()
+        try:
+            asyncio.run(self.async_http_client.aclose())
+        except RuntimeError:
+            # Called from inside an event loop; the async pool is closed on garbage collection
+            pass
+
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Return the shared client, rebuilding it only if the API key changes"""
+    global _client, _client_key
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            if _client is not None:
+                _client.close()
+            _client = LLMClient(api_key)
+            _client_key = api_key
+        return _client
+
+
+def get_llm(api_key):
+    """Shared ChatOpenAI instance for LangChain chains"""
+    return get_client(api_key).llm
+
+
+def get_metrics():
+    """Pool and queue metrics for the shared client, or {} before first use"""
+    with _client_lock:
+        client = _client
+    return client.metrics() if client is not None else {}
+
+
+registry.register_gauges("llm", get_metrics)
+
+
+def reset_client():
+    """Close and drop the shared client (used when settings change)"""
+    global _client, _client_key
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _client_key = None
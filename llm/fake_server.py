@@ -0,0 +1,119 @@
+# fake_server.py
+"""Local OpenAI-compatible server for exercising the LLM client without the network.
+
+Run standalone with ``python -m llm.fake_server --port 8011`` and point the app at it
+with ``LLM_BASE_URL=http://127.0.0.1:8011/v1``.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def echo_responder(messages):
+    """Default reply: a fixed prefix plus the length of the last message"""
+    last = messages[-1]['content'] if messages else ""
+    return f"Fake summary ({len(last)} characters of input)."
+
+
+class FakeOpenAIServer:
+    """Threaded HTTP server answering /v1/chat/completions deterministically"""
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, responder=echo_responder):
+        self.delay = delay
+        self.responder = responder
+        self.request_count = 0
+        self.peak_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send(404, {'error': {'message': f"Unknown path {self.path}"}})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.request_count += 1
+                    server._active += 1
+                    server.peak_concurrency = max(server.peak_concurrency, server._active)
+                try:
+                    if server.delay:
+                        time.sleep(server.delay)
+                    content = server.responder(body.get('messages', []))
+                finally:
+                    with server._lock:
+                        server._active -= 1
+                self._send(200, {
+                    'id': f"chatcmpl-fake-{server.request_count}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'fake-model'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible endpoint")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8011)
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds to sleep per request")
+    args = parser.parse_args()
+
+    fake = FakeOpenAIServer(args.host, args.port, delay=args.delay)
+    print(f"Fake LLM listening on {fake.base_url}")
+    try:
+        fake._httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake._httpd.server_close()
@@ -0,0 +1,152 @@
+# startup.py
+"""Cold-start profiling for app.py.
+
+``python -m perf.startup`` imports the app in a fresh interpreter with
+``-X importtime`` and prints the slowest modules. With ``--budget`` it exits
+non-zero when the import takes longer than the budget or when a deferred heavy
+dependency is loaded at import time, so it can gate CI and container builds.
+
+Dependencies that the baseline (``import streamlit``) already loads, such as
+plotly, are outside the app's control and are not flagged.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 2.0))
+DEFAULT_BASELINE = "streamlit"
+
+# Modules that `import app` must not add beyond what the baseline imports
+DEFERRED_MODULES = [
+    'langchain',
+    'langchain_community',
+    'faiss',
+    'sentence_transformers',
+    'torch',
+    'plotly',
+    'PyPDF2',
+    'sklearn',
+    'joblib',
+    'fpdf',
+    'httpx',
+]
+
+_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - start\n"
+    "import json\n"
+    "print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))\n"
+)
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into [{'module', 'self_us', 'cumulative_us'}]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+            rows.append({
+                'module': name.rstrip(),
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def _probe(module, cwd):
+    """(probe output, importtime stderr) for importing `module` in a clean interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def _roots(modules):
+    return {name.split(".")[0] for name in modules}
+
+
+def profile_imports(module="app", cwd=None, baseline=DEFAULT_BASELINE):
+    """Import `module` in a clean interpreter and return timing details
+
+    `deferred_loaded` lists the deferred modules that `module` loads and
+    `baseline` (imported on its own, in another interpreter) does not.
+    """
+    cwd = cwd or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    probe, stderr = _probe(module, cwd)
+    baseline_roots = _roots(_probe(baseline, cwd)[0]['modules']) if baseline else set()
+    loaded_roots = _roots(probe['modules'])
+    return {
+        'module': module,
+        'seconds': probe['seconds'],
+        'imports': parse_importtime(stderr),
+        'baseline': baseline,
+        'deferred_loaded': [
+            name for name in DEFERRED_MODULES if name in loaded_roots and name not in baseline_roots
+        ],
+    }
+
+
+def top_level_imports(imports, top=20):
+    """Slowest top-level packages by cumulative import time"""
+    totals = {}
+    for row in imports:
+        root = row['module'].lstrip().split(".")[0]
+        totals[root] = max(totals.get(root, 0), row['cumulative_us'])
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return [{'module': name, 'cumulative_ms': us / 1000} for name, us in ranked[:top]]
+
+
+def check_budget(report, budget):
+    """Return a list of human-readable budget violations (empty when within budget)"""
+    problems = []
+    if report['seconds'] > budget:
+        problems.append(f"import took {report['seconds']:.2f}s, budget is {budget:.2f}s")
+    for name in report['deferred_loaded']:
+        problems.append(f"'{name}' is imported at startup but should be deferred to first use")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the app")
+    parser.add_argument('--module', default="app")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="Module whose own imports are not flagged ('' for none)")
+    parser.add_argument('--top', type=int, default=20, help="Number of modules to list")
+    parser.add_argument('--budget', type=float, nargs='?', const=DEFAULT_BUDGET_SECONDS,
+                        help="Fail if the import exceeds this many seconds")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = profile_imports(args.module, baseline=args.baseline or None)
+    slowest = top_level_imports(report['imports'], args.top)
+
+    if args.json:
+        print(json.dumps({**report, 'imports': slowest}, indent=2))
+    else:
+        print(f"import {args.module}: {report['seconds'] * 1000:.0f} ms")
+        for row in slowest:
+            print(f"  {row['cumulative_ms']:9.1f} ms  {row['module']}")
+
+    if args.budget is not None:
+        problems = check_budget(report, args.budget)
+        for problem in problems:
+            print(f"FAIL: {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
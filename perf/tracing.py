@@ -0,0 +1,336 @@
+# tracing.py
+"""Lightweight per-stage spans for the report processing pipeline.
+
+Each span records wall time, CPU time, peak traced memory (when
+``TRACE_MEMORY=1`` enables tracemalloc) and an optional item count. Finished
+spans are written as one JSON log line each, aggregated for the
+Prometheus-style ``/metrics`` endpoint and collected into the current run so
+the UI can show a per-run breakdown.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("medical_chatbot.trace")
+if os.getenv("TRACE_LOG", "1") != "0" and not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+if os.getenv("TRACE_MEMORY") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# tracemalloc has one process-wide peak, so only one thread at a time may reset
+# and read it; spans on other threads meanwhile record no memory peak
+_memory_owner = None
+_memory_owner_lock = threading.Lock()
+
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_run = contextvars.ContextVar("trace_run", default=None)
+_span_stack = contextvars.ContextVar("trace_span_stack", default=())
+
+
+class Span:
+    """Measurements for one stage; set `items` inside the block to record a count"""
+
+    def __init__(self, name, items=None, attrs=None):
+        self.name = name
+        self.items = items
+        self.attrs = attrs or {}
+        self.started_at = time.time()
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_memory_bytes = None
+        self.error = None
+        self._child_peak = 0
+
+    def to_dict(self):
+        return {
+            'span': self.name,
+            'started_at': self.started_at,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'items': self.items,
+            'error': self.error,
+            **self.attrs,
+        }
+
+
+class Run:
+    """Spans collected during one processing run"""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_rows(self):
+        with self._lock:
+            return [span.to_dict() for span in self.spans]
+
+    def total_wall_seconds(self):
+        with self._lock:
+            return sum(span.wall_seconds for span in self.spans if not span.attrs.get('nested'))
+
+
+class MetricsRegistry:
+    """Aggregated per-stage counters, histograms and pluggable gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._gauge_sources = {}
+
+    def observe(self, span):
+        with self._lock:
+            stage = self._stages.setdefault(span.name, {
+                'count': 0,
+                'errors': 0,
+                'wall_seconds_sum': 0.0,
+                'cpu_seconds_sum': 0.0,
+                'items_sum': 0,
+                'peak_memory_bytes_max': 0,
+                'buckets': [0] * len(HISTOGRAM_BUCKETS),
+            })
+            stage['count'] += 1
+            stage['errors'] += 1 if span.error else 0
+            stage['wall_seconds_sum'] += span.wall_seconds
+            stage['cpu_seconds_sum'] += span.cpu_seconds
+            stage['items_sum'] += span.items or 0
+            if span.peak_memory_bytes:
+                stage['peak_memory_bytes_max'] = max(stage['peak_memory_bytes_max'], span.peak_memory_bytes)
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if span.wall_seconds <= bound:
+                    stage['buckets'][i] += 1
+
+    def register_gauges(self, prefix, source):
+        """Expose `source()` -> {name: number} (nested dicts allowed) as gauges"""
+        with self._lock:
+            self._gauge_sources[prefix] = source
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stage, buckets=list(stage['buckets'])) for name, stage in self._stages.items()}
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP pipeline_stage_seconds Wall time per pipeline stage",
+            "# TYPE pipeline_stage_seconds histogram",
+        ]
+        stages = self.snapshot()
+        for name, stage in sorted(stages.items()):
+            for bound, count in zip(HISTOGRAM_BUCKETS, stage['buckets']):
+                lines.append(f'pipeline_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'pipeline_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'pipeline_stage_seconds_sum{{stage="{name}"}} {stage["wall_seconds_sum"]:.6f}')
+            lines.append(f'pipeline_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+
+        for metric, key, kind in [
+            ("pipeline_stage_cpu_seconds_total", 'cpu_seconds_sum', "counter"),
+            ("pipeline_stage_items_total", 'items_sum', "counter"),
+            ("pipeline_stage_errors_total", 'errors', "counter"),
+            ("pipeline_stage_peak_memory_bytes", 'peak_memory_bytes_max', "gauge"),
+        ]:
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stage in sorted(stages.items()):
+                lines.append(f'{metric}{{stage="{name}"}} {stage[key]}')
+
+        lines.append("# TYPE process_max_rss_bytes gauge")
+        lines.append(f"process_max_rss_bytes {max_rss_bytes()}")
+
+        with self._lock:
+            sources = list(self._gauge_sources.items())
+        for prefix, source in sources:
+            try:
+                values = source() or {}
+            except Exception as e:
+                logger.warning(json.dumps({'event': 'gauge_error', 'prefix': prefix, 'error': str(e)}))
+                continue
+            for name, value in _flatten(values, prefix):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(values, prefix):
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def max_rss_bytes():
+    """Peak resident set size of the process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+registry = MetricsRegistry()
+
+
+def _claim_memory():
+    """(measure, owns): measure when no other thread is measuring; owns when this span took the slot"""
+    global _memory_owner
+    me = threading.get_ident()
+    with _memory_owner_lock:
+        if _memory_owner is None:
+            _memory_owner = me
+            return True, True
+        return _memory_owner == me, False
+
+
+def _release_memory():
+    global _memory_owner
+    with _memory_owner_lock:
+        if _memory_owner == threading.get_ident():
+            _memory_owner = None
+
+
+@contextmanager
+def exclusive_memory_peak():
+    """Stop spans on every thread from resetting the tracemalloc peak inside the block,
+    e.g. while a benchmark reads the peak of a whole pipeline run"""
+    global _memory_owner
+    holder = object()
+    with _memory_owner_lock:
+        previous, _memory_owner = _memory_owner, holder
+    try:
+        yield
+    finally:
+        with _memory_owner_lock:
+            if _memory_owner is holder:
+                _memory_owner = previous
+
+
+def memory_tracing():
+    """True when spans record peak memory (TRACE_MEMORY=1)"""
+    return tracemalloc.is_tracing()
+
+
+@contextmanager
+def span(name, items=None, **attrs):
+    """Measure a pipeline stage: `with span("chunking") as s: ...; s.items = n`"""
+    stack = _span_stack.get()
+    current = Span(name, items, attrs)
+    if stack:
+        current.attrs.setdefault('nested', True)
+    token = _span_stack.set(stack + (current,))
+
+    tracing_memory = owns_memory = False
+    if tracemalloc.is_tracing():
+        tracing_memory, owns_memory = _claim_memory()
+    if tracing_memory:
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.wall_seconds = time.perf_counter() - wall_start
+        current.cpu_seconds = time.thread_time() - cpu_start
+        if tracing_memory:
+            # Children reset the tracemalloc peak, so fold their absolute peaks back in
+            absolute_peak = max(tracemalloc.get_traced_memory()[1], current._child_peak)
+            current.peak_memory_bytes = max(0, absolute_peak - start_memory)
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, absolute_peak)
+        if owns_memory:
+            _release_memory()
+        _span_stack.reset(token)
+
+        run = _current_run.get()
+        if run is not None:
+            current.attrs.setdefault('run_id', run.run_id)
+            run.add(current)
+        registry.observe(current)
+        logger.info(json.dumps(current.to_dict(), default=str))
+
+
+def traced(name=None, items=None):
+    """Decorator form of `span`; `items(result)` may compute the item count"""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name) as current:
+                result = fn(*args, **kwargs)
+                if items is not None and result is not None:
+                    try:
+                        current.items = items(result)
+                    except Exception:
+                        pass
+                return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace_run(run_id=None):
+    """Collect every span finished inside the block into a Run"""
+    run = Run(run_id)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host="0.0.0.0"):
+    """Serve /metrics on METRICS_PORT (once per process); returns the port or None"""
+    global _server
+    port = port if port is not None else os.getenv("METRICS_PORT")
+    if port in (None, ""):
+        return None
+
+    with _server_lock:
+        if _server is not None:
+            return _server.server_address[1]
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        _server = ThreadingHTTPServer((host, int(port)), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server.server_address[1]
@@ -0,0 +1,257 @@
+# manager.py
+"""Memory-bounded store for per-session artifacts.
+
+Each Streamlit session's report text, chunks, summary and FAISS index are kept
+here instead of in `st.session_state`. When the approximate total exceeds the
+global budget, the least recently used idle sessions are spilled to disk (FAISS
+`write_index` plus gzip-compressed pickles) and reloaded on their next access.
+Sessions idle for longer than the TTL are evicted entirely.
+"""
+import gzip
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from perf.tracing import registry, span
+
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", 1024))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", 6 * 3600))
+SESSION_SPILL_DIR = os.getenv(
+    "SESSION_SPILL_DIR", os.path.join(os.getenv("JOB_STORE_DIR", "job_store"), "sessions")
+)
+
+# Rebuilt from the other artifacts after a reload, so dropped instead of spilled;
+# only the memory they add on top of those artifacts is counted (see derived_size)
+DERIVED_KEYS = ('conversation',)
+# Small objects that stay in memory even when the session is spilled
+RESIDENT_KEYS = ('chat_memory', 'namespaces')
+
+
+def is_vectorstore(value):
+    return hasattr(value, 'index') and hasattr(value, 'docstore') and hasattr(value, 'index_to_docstore_id')
+
+
+def estimate_size(value):
+    """Approximate bytes held by an artifact"""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if is_vectorstore(value):
+        docs = getattr(value.docstore, '_dict', {}).values()
+        return (
+            value.index.ntotal * value.index.d * 4
+            + sum(sys.getsizeof(doc.page_content) for doc in docs)
+        )
+    return sys.getsizeof(value)
+
+
+def derived_size(value):
+    """Bytes a derived artifact holds beyond the artifacts it was built from.
+
+    A conversation chain shares the session's vectorstore, but its retriever
+    may add its own index (e.g. the hybrid retriever's BM25 postings).
+    """
+    retriever = getattr(value, 'retriever', None)
+    approximate_bytes = getattr(retriever, 'approximate_bytes', None)
+    return approximate_bytes() if callable(approximate_bytes) else 0
+
+
+class SessionEntry:
+    def __init__(self):
+        self.artifacts = {}
+        self.sizes = {}
+        self.spilled = False
+        self.last_access = time.monotonic()
+        # Embedding models are shared across sessions; keep the reference, not a copy
+        self.embeddings = {}
+
+    @property
+    def resident_bytes(self):
+        return sum(self.sizes.values()) if not self.spilled else 0
+
+
+class SessionResourceManager:
+    """Tracks per-session artifact sizes and spills LRU idle sessions to disk"""
+
+    def __init__(self, budget_bytes=None, spill_dir=SESSION_SPILL_DIR, ttl_seconds=SESSION_TTL_SECONDS):
+        self.budget_bytes = budget_bytes or int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.spill_dir = spill_dir
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self.spills = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def _entry(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = SessionEntry()
+        entry.last_access = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return entry
+
+    def put(self, session_id, **artifacts):
+        """Store artifacts for a session, then spill other sessions if over budget"""
+        with self._lock:
+            entry = self._entry(session_id)
+            if entry.spilled:
+                self._reload(session_id, entry)
+            for key, value in artifacts.items():
+                entry.artifacts[key] = value
+                entry.sizes[key] = derived_size(value) if key in DERIVED_KEYS else estimate_size(value)
+            self._enforce_budget(keep=session_id)
+
+    def get(self, session_id, key, default=None):
+        """Artifact for a session, reloading it from disk if it was spilled"""
+        with self._lock:
+            entry = self._entry(session_id)
+            if entry.spilled and key not in RESIDENT_KEYS:
+                self._reload(session_id, entry)
+                self._enforce_budget(keep=session_id)
+            return entry.artifacts.get(key, default)
+
+    def drop(self, session_id):
+        """Forget a session and delete anything it spilled"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            shutil.rmtree(self._spill_path(session_id), ignore_errors=True)
+
+    def _spill_path(self, session_id, name=""):
+        return os.path.join(self.spill_dir, session_id, name)
+
+    def _enforce_budget(self, keep=None):
+        now = time.monotonic()
+        for session_id, entry in list(self._sessions.items()):
+            if session_id != keep and now - entry.last_access > self.ttl_seconds:
+                self.drop(session_id)
+                self.evictions += 1
+
+        total = self.resident_bytes()
+        # OrderedDict iterates least recently used first
+        for session_id, entry in list(self._sessions.items()):
+            if total <= self.budget_bytes:
+                break
+            if session_id == keep or entry.spilled or not entry.resident_bytes:
+                continue
+            total -= entry.resident_bytes
+            self._spill(session_id, entry)
+
+    def _spill(self, session_id, entry):
+        with span("session_spill") as stage:
+            os.makedirs(self._spill_path(session_id), exist_ok=True)
+            plain = {}
+            for key, value in entry.artifacts.items():
+                if key in DERIVED_KEYS or key in RESIDENT_KEYS:
+                    continue
+                if is_vectorstore(value):
+                    import faiss
+
+                    faiss.write_index(value.index, self._spill_path(session_id, f"{key}.faiss"))
+                    with gzip.open(self._spill_path(session_id, f"{key}.docstore.pkl.gz"), 'wb') as f:
+                        pickle.dump((value.docstore, value.index_to_docstore_id), f)
+                    entry.embeddings[key] = value.embedding_function
+                    plain[key] = None
+                else:
+                    plain[key] = value
+            with gzip.open(self._spill_path(session_id, "artifacts.pkl.gz"), 'wb') as f:
+                pickle.dump(plain, f)
+
+            stage.items = len(entry.artifacts)
+            entry.artifacts = {key: entry.artifacts[key] for key in RESIDENT_KEYS if key in entry.artifacts}
+            for key in DERIVED_KEYS:
+                entry.sizes.pop(key, None)
+            entry.spilled = True
+            self.spills += 1
+
+    def _reload(self, session_id, entry):
+        with span("session_reload") as stage:
+            with gzip.open(self._spill_path(session_id, "artifacts.pkl.gz"), 'rb') as f:
+                plain = pickle.load(f)
+            for key, value in plain.items():
+                if value is None and os.path.exists(self._spill_path(session_id, f"{key}.faiss")):
+                    value = self._load_vectorstore(session_id, key, entry.embeddings.pop(key, None))
+                entry.artifacts[key] = value
+            stage.items = len(plain)
+            entry.spilled = False
+            self.reloads += 1
+            shutil.rmtree(self._spill_path(session_id), ignore_errors=True)
+
+    def _load_vectorstore(self, session_id, key, embedding_function):
+        import faiss
+        from langchain_community.vectorstores import FAISS
+
+        index = faiss.read_index(self._spill_path(session_id, f"{key}.faiss"))
+        with gzip.open(self._spill_path(session_id, f"{key}.docstore.pkl.gz"), 'rb') as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(
+            embedding_function=embedding_function,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(entry.resident_bytes for entry in self._sessions.values())
+
+    def usage(self, session_id):
+        """Per-artifact byte estimates for one session"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return {'resident_bytes': 0, 'spilled': False, 'artifacts': {}}
+            return {
+                'resident_bytes': entry.resident_bytes,
+                'spilled': entry.spilled,
+                'artifacts': dict(entry.sizes),
+            }
+
+    def report(self):
+        """Memory usage of every tracked session, most recently used last"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    'session': session_id[:8],
+                    'resident_bytes': entry.resident_bytes,
+                    'spilled': entry.spilled,
+                    'idle_seconds': round(now - entry.last_access, 1),
+                }
+                for session_id, entry in self._sessions.items()
+            ]
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'budget_bytes': self.budget_bytes,
+                'resident_bytes': self.resident_bytes(),
+                'sessions': len(self._sessions),
+                'spilled_sessions': sum(1 for entry in self._sessions.values() if entry.spilled),
+                'spills': self.spills,
+                'reloads': self.reloads,
+                'evictions': self.evictions,
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_session_manager():
+    """Process-wide session resource manager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionResourceManager()
+            registry.register_gauges("sessions", _manager.metrics)
+        return _manager
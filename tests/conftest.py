@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Tests import the app's top-level packages (llm, jobs, app, ...) from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
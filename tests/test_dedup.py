@@ -0,0 +1,57 @@
+# test_dedup.py
+"""Near-duplicate matching must never hand one patient's results to another."""
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+PyPDF2 = pytest.importorskip("PyPDF2")
+
+from data_analysis.dedup import NearDuplicateIndex, fingerprint
+
+SAMPLE_REPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "uploads", "Sample-medical-report.pdf")
+
+
+@pytest.fixture(scope="module")
+def report_text():
+    reader = PyPDF2.PdfReader(SAMPLE_REPORT)
+    return "\n".join(page.extract_text() for page in reader.pages)
+
+
+@pytest.fixture
+def index(tmp_path, report_text):
+    index = NearDuplicateIndex(path=str(tmp_path / "dedup.sqlite3"))
+    index.add("job-1", index.signature(report_text), fingerprint(report_text), "patient:A")
+    return index
+
+
+def lookup(index, text, scope="patient:A"):
+    return index.find(index.signature(text), fingerprint(text), scope)
+
+
+def test_rescan_with_whitespace_noise_is_a_duplicate(index, report_text):
+    rescan = report_text.replace("  ", " ").replace("SAMPLE", "SAMPLE (rescanned)")
+    match = lookup(index, rescan)
+    assert match is not None and match[0] == "job-1"
+
+
+def test_same_report_one_value_changed_is_not_a_duplicate(index, report_text):
+    changed = report_text.replace("4 plus 3, giving 8", "4 plus 3, giving 9")
+    assert changed != report_text
+    assert index.hasher.similarity(index.signature(changed), index.signature(report_text)) > 0.9
+    assert lookup(index, changed) is None
+
+
+def test_same_template_different_patient_is_not_a_duplicate(index, report_text):
+    other = report_text.replace("Mr Tan Ah Kow  \n", "Mr Lim Bee Leng  \n", 1)
+    assert other != report_text
+    assert lookup(index, other) is None
+
+    other_id = report_text.replace("S1111111X", "S7654321A").replace("55 years old", "62 years old")
+    assert lookup(index, other_id) is None
+
+
+def test_identical_report_for_another_patient_is_not_reused(index, report_text):
+    assert lookup(index, report_text, scope="patient:B") is None
+    assert lookup(index, report_text, scope="session:x") is None
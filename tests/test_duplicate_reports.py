@@ -0,0 +1,105 @@
+# test_duplicate_reports.py
+"""process_reports end to end: a re-upload of a processed report reuses its results."""
+import os
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+pytest.importorskip("PyPDF2")
+pytest.importorskip("fpdf")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import app
+from data_analysis.dedup import NearDuplicateIndex
+from jobs.scheduler import DONE, FAILED, JobScheduler
+from llm.client import reset_client
+from llm.fake_server import FakeOpenAIServer
+
+SAMPLE_REPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "uploads", "Sample-medical-report.pdf")
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    with FakeOpenAIServer() as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        monkeypatch.setenv("TOGETHER_API_KEY", "test-key")
+        monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+        reset_client()
+        yield server
+        reset_client()
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    # The embedding model is downloaded on first use; a deterministic fake keeps this offline
+    monkeypatch.setattr(app, "get_embeddings", lambda: DeterministicFakeEmbedding(size=32))
+    dedup_index = NearDuplicateIndex(path=str(tmp_path / "dedup.sqlite3"))
+    monkeypatch.setattr(app, "get_dedup_index", lambda: dedup_index)
+    scheduler = JobScheduler(store_dir=str(tmp_path / "jobs"), workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def run_job(scheduler, *args, **kwargs):
+    job_id = scheduler.submit(app.process_reports, *args, **kwargs)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        status = scheduler.status(job_id)
+        if status['status'] == FAILED:
+            pytest.fail(f"Job failed during {status['stage']}: {status['error']}")
+        if status['status'] == DONE:
+            return job_id, scheduler.result(job_id)
+        time.sleep(0.05)
+    pytest.fail("Job did not finish in time")
+
+
+def sample_upload(name="report.pdf"):
+    with open(SAMPLE_REPORT, 'rb') as f:
+        return [(name, f.read())]
+
+
+def test_same_report_twice_reuses_first_result(scheduler, fake_llm):
+    first_id, first = run_job(scheduler, sample_upload(), scope="session-1")
+    assert 'duplicate_of' not in first
+    assert first['summary']
+    llm_calls = fake_llm.request_count
+
+    second_id, second = run_job(scheduler, sample_upload("rescan.pdf"), scope="session-1")
+    assert second['duplicate_of'] == first_id
+    assert second['duplicate_similarity'] >= app.get_dedup_index().threshold
+    assert second['text_chunks'] == first['text_chunks']
+    # No summarization for the re-upload
+    assert fake_llm.request_count == llm_calls
+
+    # The duplicate is indexed too, so a third upload can match either job
+    third_id, third = run_job(scheduler, sample_upload(), scope="session-1")
+    assert third['duplicate_of'] in (first_id, second_id)
+
+
+def test_other_sessions_do_not_reuse_results(scheduler, fake_llm):
+    run_job(scheduler, sample_upload(), scope="session-1")
+    _, other = run_job(scheduler, sample_upload(), scope="session-2")
+    assert 'duplicate_of' not in other
+
+
+def test_patient_shard_gets_each_report_once(scheduler, fake_llm, tmp_path, monkeypatch):
+    from vectorstores import sharded
+
+    store = sharded.ShardedVectorStore(app.get_embeddings(), root=str(tmp_path / "shards"))
+    monkeypatch.setattr(sharded, "_store", store)
+
+    first_id, first = run_job(scheduler, sample_upload(), patient_id="patient-1")
+    shard = store.open("patient-1")
+    assert shard is not None
+    assert shard.index.ntotal == len(first['text_chunks'])
+    assert {record['metadata']['job_id'] for record in shard.records} == {first_id}
+
+    # A re-upload for the same patient must not add the chunks again
+    run_job(scheduler, sample_upload(), patient_id="patient-1")
+    assert store.open("patient-1").index.ntotal == len(first['text_chunks'])
+    assert store.search(["patient-1"], "diagnosis dementia", k=2)
@@ -0,0 +1,74 @@
+# test_export.py
+"""Cohort export: Parquet and CSV round trips, unit normalization, re-uploads."""
+import csv
+import gzip
+
+import pytest
+
+from data_analysis.export import EXPORT_COLUMNS, export_reports
+from jobs.scheduler import JobScheduler
+
+REPORT = {
+    'filenames': ['a.pdf'],
+    'parsed_data': [
+        {'metric': 'Glucose', 'value': '7.0', 'unit': 'mmol/L', 'reference_range': '3.9-5.6', 'status': 'High'},
+        {'metric': 'Hemoglobin', 'value': '13.5', 'unit': 'g/dL', 'reference_range': '12-16', 'status': 'Normal'},
+    ],
+    'risk_assessment': {'anemia': {'probability': 0.25, 'advice': ''}},
+}
+
+
+@pytest.fixture
+def job_db(tmp_path):
+    scheduler = JobScheduler(store_dir=str(tmp_path / "jobs"), workers=1)
+    first = scheduler.submit(lambda job: dict(REPORT))
+    scheduler.submit(lambda job: {**REPORT, 'filenames': ['rescan.pdf'], 'duplicate_of': first})
+    scheduler.shutdown()
+    return scheduler.db_path
+
+
+def check_rows(rows):
+    # The re-upload reused the first job's result, so only its rows are exported
+    assert len(rows) == 2
+    assert {row['files'] for row in rows} == {'a.pdf'}
+    glucose = next(row for row in rows if row['metric'] == 'Glucose')
+    assert float(glucose['value_normalized']) == pytest.approx(126.112)
+    assert float(glucose['reference_low_normalized']) == pytest.approx(70.2624)
+    assert float(glucose['reference_high_normalized']) == pytest.approx(100.8896)
+    assert glucose['unit_normalized'] == 'mg/dL'
+    assert float(glucose['anemia_probability']) == pytest.approx(0.25)
+    hemoglobin = next(row for row in rows if row['metric'] == 'Hemoglobin')
+    assert float(hemoglobin['reference_low_normalized']) == 12.0
+
+
+def test_parquet_round_trip(job_db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = str(tmp_path / "cohort.parquet")
+    stats = export_reports(job_db, out, fmt='parquet', batch_size=1)
+    assert (stats['reports'], stats['duplicates_skipped'], stats['rows']) == (1, 1, 2)
+
+    table = pq.read_table(out)
+    assert table.column_names == [name for name, _ in EXPORT_COLUMNS]
+    rows = table.to_pylist()
+    check_rows(rows)
+    assert [row['anomaly'] for row in rows] == [True, False]
+
+
+def test_csv_round_trip(job_db, tmp_path):
+    out = str(tmp_path / "cohort.csv.gz")
+    export_reports(job_db, out, fmt='csv')
+
+    with gzip.open(out, 'rt', newline='') as f:
+        rows = list(csv.DictReader(f))
+    check_rows(rows)
+    assert [row['anomaly'] for row in rows] == ['True', 'False']
+
+
+def test_incremental_export_only_writes_new_reports(job_db, tmp_path):
+    watermark = str(tmp_path / "cohort.watermark.json")
+    first = export_reports(job_db, str(tmp_path / "first.csv"), fmt='csv', watermark_path=watermark)
+    second = export_reports(job_db, str(tmp_path / "second.csv"), fmt='csv', watermark_path=watermark)
+    assert first['rows'] == 2
+    assert second['rows'] == 0
+    with pytest.raises(FileExistsError):
+        export_reports(job_db, str(tmp_path / "first.csv"), fmt='csv', watermark_path=watermark)
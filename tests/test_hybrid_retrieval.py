@@ -0,0 +1,51 @@
+# test_hybrid_retrieval.py
+import types
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from sessions.manager import SessionResourceManager
+from vectorstores.hybrid import reciprocal_rank_fusion
+from vectorstores.retriever import HybridRetriever
+
+CHUNKS = [
+    "Hemoglobin: 10.2 g/dL (Ref: 12-16) Low\nMCV: 72.0 fL (Ref: 80-100) Low",
+    "TSH: 5.2 mIU/L (Ref: 0.4-4) High\nGlucose: 91.0 mg/dL (Ref: 70-100) Normal",
+    "Patient reports mild fatigue over the past month.\nFollow-up testing is advised.",
+]
+
+
+@pytest.fixture
+def vectorstore():
+    return FAISS.from_texts(CHUNKS, DeterministicFakeEmbedding(size=32), metadatas=[{'job_id': "j1"}] * 3)
+
+
+def test_rrf_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [doc_id for _, doc_id in fused] == [1, 3, 2]
+
+
+@pytest.mark.parametrize("reranker", ["none", "overlap"])
+def test_exact_lab_values_are_found(vectorstore, reranker):
+    retriever = HybridRetriever.from_vectorstore(vectorstore, k=1, reranker=reranker)
+    [document] = retriever.invoke("TSH 5.2")
+    assert document.page_content == CHUNKS[1]
+    assert document.metadata['job_id'] == "j1"
+
+
+def test_retriever_reads_chunks_from_the_vectorstore(vectorstore):
+    retriever = HybridRetriever.from_vectorstore(vectorstore)
+    assert not any(isinstance(value, list) for value in vars(retriever.searcher).values())
+    assert retriever.approximate_bytes() > 0
+
+
+def test_session_budget_counts_the_retriever_index(vectorstore, tmp_path):
+    retriever = HybridRetriever.from_vectorstore(vectorstore)
+    manager = SessionResourceManager(budget_bytes=10**9, spill_dir=str(tmp_path))
+    manager.put("s1", vectorstore=vectorstore, conversation=types.SimpleNamespace(retriever=retriever))
+    assert manager.usage("s1")['artifacts']['conversation'] == retriever.approximate_bytes()
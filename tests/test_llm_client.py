@@ -0,0 +1,67 @@
+# test_llm_client.py
+"""LLMClient against the local fake OpenAI-compatible server."""
+import threading
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_community")
+
+from llm.client import LLMClient, load_settings
+from llm.fake_server import FakeOpenAIServer
+
+
+@pytest.fixture
+def fake_server():
+    with FakeOpenAIServer(delay=0.3) as server:
+        yield server
+
+
+@pytest.fixture
+def client(fake_server):
+    settings = load_settings()
+    settings['base_url'] = fake_server.base_url
+    settings['max_retries'] = 0
+    client = LLMClient("test-key", settings)
+    yield client
+    client.close()
+
+
+def test_complete_returns_server_reply(client, fake_server):
+    assert client.complete("hello") == "Fake summary (5 characters of input)."
+    assert fake_server.request_count == 1
+    assert client.metrics()['queue']['completed'] == 1
+
+
+def test_identical_concurrent_prompts_share_one_call(client, fake_server):
+    workers = 6
+    barrier = threading.Barrier(workers)
+    replies = []
+
+    def ask():
+        barrier.wait()
+        replies.append(client.complete("same report text"))
+
+    threads = [threading.Thread(target=ask) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert replies == ["Fake summary (16 characters of input)."] * workers
+    assert fake_server.request_count == 1
+    coalescing = client.metrics()['coalescing']
+    assert coalescing['upstream_calls'] == 1
+    assert coalescing['coalesced'] == workers - 1
+
+
+def test_different_prompts_are_not_coalesced(client, fake_server):
+    threads = [threading.Thread(target=client.complete, args=(f"prompt {i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake_server.request_count == 3
+    assert fake_server.peak_concurrency >= 2
@@ -0,0 +1,29 @@
+# test_patient_access.py
+"""The sidebar Patient ID maps to at most one shard namespace, scoped to the signed-in user."""
+import pytest
+
+pytest.importorskip("streamlit")
+
+import app
+
+
+def test_single_patient_id_without_login(monkeypatch):
+    monkeypatch.setattr(app, "signed_in_user", lambda: None)
+    assert app.patient_namespaces("") == ()
+    assert app.patient_namespaces("  P-100 ") == ("P-100",)
+
+
+def test_several_patient_ids_are_rejected(monkeypatch):
+    monkeypatch.setattr(app, "signed_in_user", lambda: None)
+    assert app.patient_namespaces("P-100, P-200") == ()
+
+
+def test_namespace_is_scoped_to_the_signed_in_user(monkeypatch):
+    monkeypatch.setattr(app, "signed_in_user", lambda: "dr.lim@example.org")
+    assert app.patient_namespaces("P-100") == ("dr.lim@example.org/P-100",)
+
+
+def test_login_can_be_required(monkeypatch):
+    monkeypatch.setattr(app, "PATIENT_SHARDS_REQUIRE_LOGIN", True)
+    monkeypatch.setattr(app, "signed_in_user", lambda: None)
+    assert app.patient_namespaces("P-100") == ()
@@ -0,0 +1,53 @@
+# test_session_manager.py
+"""Sessions over the memory budget are spilled to disk and reloaded intact."""
+import os
+import time
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from sessions.manager import SessionResourceManager, estimate_size
+
+CHUNKS = [f"Glucose {90 + i} mg/dL measured on day {i}" for i in range(50)]
+
+
+@pytest.fixture
+def vectorstore():
+    return FAISS.from_texts(CHUNKS, DeterministicFakeEmbedding(size=64), metadatas=[{'job_id': 'a'}] * len(CHUNKS))
+
+
+def test_spill_and_reload_round_trip(tmp_path, vectorstore):
+    # Room for one session's artifacts, not two
+    budget = estimate_size(vectorstore) + estimate_size(CHUNKS) + 4096
+    manager = SessionResourceManager(budget_bytes=budget, spill_dir=str(tmp_path))
+    manager.put("a", vectorstore=vectorstore, text_chunks=CHUNKS, summary="summary a", chat_memory=["hello"])
+    manager.put("b", vectorstore=vectorstore, text_chunks=CHUNKS, summary="summary b")
+
+    assert manager.usage("a")['spilled'] and not manager.usage("b")['spilled']
+    assert manager.resident_bytes() <= budget
+    assert os.path.exists(tmp_path / "a" / "vectorstore.faiss")
+    # Resident keys stay available without a reload
+    assert manager.get("a", "chat_memory") == ["hello"] and manager.usage("a")['spilled']
+
+    reloaded = manager.get("a", "vectorstore")
+    assert not manager.usage("a")['spilled'] and manager.usage("b")['spilled']
+    assert not os.path.exists(tmp_path / "a")
+    assert manager.get("a", "text_chunks") == CHUNKS and manager.get("a", "summary") == "summary a"
+    assert reloaded.index.ntotal == len(CHUNKS)
+    query = vectorstore.embeddings.embed_query(CHUNKS[7])
+    assert reloaded.similarity_search_by_vector(query, k=1)[0].page_content == CHUNKS[7]
+    assert manager.metrics()['spills'] == 2 and manager.metrics()['reloads'] == 1
+
+
+def test_idle_sessions_are_evicted(tmp_path):
+    manager = SessionResourceManager(budget_bytes=1 << 20, spill_dir=str(tmp_path), ttl_seconds=0.05)
+    manager.put("old", summary="old")
+    time.sleep(0.1)
+    manager.put("new", summary="new")
+    assert [row['session'] for row in manager.report()] == ["new"]
+    assert manager.metrics()['evictions'] == 1
@@ -0,0 +1,67 @@
+# test_sharded.py
+"""Shard writes publish whole versions; readers never pair an index with other records."""
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vectorstores.sharded import SHARD_KEEP_VERSIONS, ShardedVectorStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ShardedVectorStore(DeterministicFakeEmbedding(size=16), root=str(tmp_path / "shards"))
+
+
+def test_open_sees_each_new_version(store):
+    assert store.open("patient-1") is None
+    store.add_texts("patient-1", ["Hemoglobin 13.5 g/dL"], [{'job_id': 'a'}], dedup_key='job_id')
+    assert len(store.open("patient-1").records) == 1
+    assert store.open("patient-1") is store.open("patient-1")
+
+    # Another process (a second store on the same root) publishes a new version
+    other = ShardedVectorStore(store.embeddings, root=store.root)
+    other.add_texts("patient-1", ["TSH 5.2 mIU/L"], [{'job_id': 'b'}], dedup_key='job_id')
+    shard = store.open("patient-1")
+    assert [record['text'] for record in shard.records] == ["Hemoglobin 13.5 g/dL", "TSH 5.2 mIU/L"]
+    assert store.add_texts("patient-1", ["TSH 5.2 mIU/L"], [{'job_id': 'b'}], dedup_key='job_id') == 0
+
+
+def test_readers_always_see_a_consistent_shard(store):
+    writes = 20
+    errors = []
+    done = threading.Event()
+
+    def read():
+        reader = ShardedVectorStore(store.embeddings, root=store.root)
+        while not done.is_set():
+            try:
+                shard = reader.open("patient-1")
+                if shard is not None and shard.index.ntotal != len(shard.records):
+                    errors.append((shard.index.ntotal, len(shard.records)))
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for thread in readers:
+        thread.start()
+    try:
+        for i in range(writes):
+            store.add_texts("patient-1", [f"Glucose {100 + i} mg/dL"], [{'job_id': str(i)}], dedup_key='job_id')
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+
+    assert errors == []
+    assert len(store.open("patient-1").records) == writes
+    assert len(store.search(["patient-1"], "Glucose", k=writes)) == writes
+
+    (namespace_dir,) = os.listdir(store.root)
+    versions = [name for name in os.listdir(os.path.join(store.root, namespace_dir)) if name.startswith("v")]
+    assert len(versions) == SHARD_KEEP_VERSIONS
@@ -0,0 +1,25 @@
+# test_similarity.py
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from data_analysis.similarity import ReportComparator
+
+
+def test_scores_are_real_and_grouped_per_report():
+    embeddings = DeterministicFakeEmbedding(size=32)
+    vectorstore = FAISS.from_texts(
+        ["Hemoglobin: 10.2 g/dL", "TSH: 5.2 mIU/L", "Diagnosis: Dementia"],
+        embeddings,
+        metadatas=[{'job_id': 'a', 'files': "a.pdf"}] * 2 + [{'job_id': 'b', 'files': "b.pdf"}],
+    )
+
+    similar = ReportComparator(vectorstore).find_similar_reports(embeddings.embed_query("TSH: 5.2 mIU/L"))
+
+    assert [metadata['files'] for metadata, _ in similar] == ["a.pdf", "b.pdf"]
+    assert similar[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert 0.0 <= similar[1][1] < 0.99
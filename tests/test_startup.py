@@ -0,0 +1,22 @@
+# test_startup.py
+"""The cold-start gate passes for the app as shipped."""
+import pytest
+
+pytest.importorskip("streamlit")
+
+from perf.startup import check_budget, profile_imports
+
+
+def test_app_import_stays_within_budget():
+    # Generous budget: this guards deferred imports, not the speed of the CI machine
+    report = profile_imports("app")
+    assert report['deferred_loaded'] == []
+    assert check_budget(report, budget=30.0) == []
+
+
+def test_deferred_module_beyond_the_baseline_is_flagged():
+    pytest.importorskip("faiss")
+    report = profile_imports("faiss", baseline="streamlit")
+    assert 'faiss' in report['deferred_loaded']
+    assert 'plotly' not in report['deferred_loaded']
+    assert any("'faiss'" in problem for problem in check_budget(report, budget=30.0))
@@ -0,0 +1,65 @@
+# test_tracing.py
+"""Span memory peaks are measured by one thread at a time."""
+import threading
+import tracemalloc
+
+import pytest
+
+from jobs.scheduler import JobScheduler
+from perf.tracing import span, trace_run
+
+
+@pytest.fixture
+def memory_tracing():
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    yield
+    if started:
+        tracemalloc.stop()
+
+
+def test_nested_spans_fold_child_peaks_into_parent(memory_tracing):
+    with trace_run() as run:
+        with span("outer") as outer:
+            with span("inner") as inner:
+                buffer = bytearray(4_000_000)
+                del buffer
+    assert inner.peak_memory_bytes >= 4_000_000
+    assert outer.peak_memory_bytes >= inner.peak_memory_bytes
+    assert [row['span'] for row in run.to_rows()] == ["inner", "outer"]
+
+
+def test_concurrent_span_records_no_peak(memory_tracing):
+    inside = threading.Event()
+    release = threading.Event()
+    spans = {}
+
+    def measured():
+        with span("measured") as current:
+            spans['measured'] = current
+            inside.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=measured)
+    thread.start()
+    inside.wait(5)
+    with span("concurrent") as concurrent:
+        buffer = bytearray(1_000_000)
+        del buffer
+    release.set()
+    thread.join()
+
+    assert concurrent.peak_memory_bytes is None
+    assert spans['measured'].peak_memory_bytes is not None
+    with span("after") as after:
+        pass
+    assert after.peak_memory_bytes is not None
+
+
+def test_scheduler_runs_one_job_at_a_time_when_tracing_memory(memory_tracing, tmp_path):
+    scheduler = JobScheduler(store_dir=str(tmp_path), workers=4)
+    try:
+        assert scheduler.workers == 1
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,192 @@
+# hybrid.py
+"""Hybrid lexical + dense retrieval over one session's report chunks.
+
+Dense embeddings blur exact lab names and values ("MCV", "TSH 5.2"), so the
+chunks are also kept in an in-memory BM25 inverted index. Both candidate lists
+are merged with reciprocal-rank fusion, and the fused head can optionally be
+reordered by a small CPU reranker. Candidate counts are capped at every stage.
+"""
+import heapq
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+
+from perf.tracing import span
+
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+HYBRID_RERANK_CANDIDATES = int(os.getenv("HYBRID_RERANK_CANDIDATES", 10))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+# none | overlap | cross-encoder
+HYBRID_RERANKER = os.getenv("HYBRID_RERANKER", "none")
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Keeps decimals such as "5.2" and codes such as "hba1c" as single tokens
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_NUMBER = re.compile(r"^[0-9]+(?:\.[0-9]+)?$")
+# A (doc_id, tf) tuple plus its list slot
+_POSTING_BYTES = sys.getsizeof((0, 0)) + 8
+
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from had has have he her his how i in is it its "
+    "me my of on or she that the their this to was were what when where which who why with you your".split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts, with an inverted index of term frequencies"""
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((doc_id, tf))
+
+        count = len(self.lengths)
+        self.avg_length = sum(self.lengths) / count if count else 0.0
+        # Lucene's non-negative idf, so terms found in most chunks still count a little
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def approximate_bytes(self):
+        """Rough memory held by the postings, lengths and idf table"""
+        postings = sum(
+            sys.getsizeof(term) + sys.getsizeof(docs) + len(docs) * _POSTING_BYTES
+            for term, docs in self.postings.items()
+        )
+        return postings + sys.getsizeof(self.postings) + sys.getsizeof(self.idf) + sys.getsizeof(self.lengths)
+
+    def search(self, query, n=HYBRID_CANDIDATES):
+        """[(score, doc_id)] for the n best-scoring texts; texts sharing no term are skipped"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / (self.avg_length or 1))
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(n, ((score, doc_id) for doc_id, score in scores.items()))
+
+
+def reciprocal_rank_fusion(rankings, k=HYBRID_RRF_K, limit=None):
+    """Merge ranked id lists: score(id) = sum of 1 / (k + rank); returns [(score, id)]"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    fused = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(score, doc_id) for doc_id, score in fused[:limit]]
+
+
+class TermOverlapReranker:
+    """Pure-Python reranker: idf-weighted query term coverage, with exact numbers weighted up.
+
+    Rewards chunks that contain *all* of the query's terms (e.g. both "TSH" and
+    "5.2") rather than many repeats of one, which BM25 alone tends to favour.
+    """
+
+    def __init__(self, idf=None, number_weight=2.0):
+        self.idf = idf or {}
+        self.number_weight = number_weight
+
+    def _weight(self, term):
+        weight = self.idf.get(term, 1.0)
+        return weight * self.number_weight if _NUMBER.match(term) else weight
+
+    def scores(self, query, texts):
+        terms = set(tokenize(query))
+        total = sum(self._weight(term) for term in terms)
+        if not total:
+            return [0.0] * len(texts)
+        return [
+            sum(self._weight(term) for term in terms & set(tokenize(text))) / total
+            for text in texts
+        ]
+
+
+_cross_encoders = {}
+_cross_encoder_lock = threading.Lock()
+
+
+class CrossEncoderReranker:
+    """sentence-transformers cross-encoder scoring (query, chunk) pairs on CPU"""
+
+    def __init__(self, model_name=CROSS_ENCODER_MODEL):
+        with _cross_encoder_lock:
+            model = _cross_encoders.get(model_name)
+            if model is None:
+                from sentence_transformers import CrossEncoder
+
+                model = _cross_encoders[model_name] = CrossEncoder(model_name, device="cpu")
+        self.model = model
+
+    def scores(self, query, texts):
+        if not texts:
+            return []
+        return [float(score) for score in self.model.predict([(query, text) for text in texts])]
+
+
+def make_reranker(name=HYBRID_RERANKER, bm25=None):
+    """Reranker for a HYBRID_RERANKER value, or None when reranking is off"""
+    if name in (None, "", "none"):
+        return None
+    if name == "overlap":
+        return TermOverlapReranker(idf=bm25.idf if bm25 is not None else None)
+    if name == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"Unknown reranker {name!r}; expected none, overlap or cross-encoder")
+
+
+class HybridSearcher:
+    """BM25 + dense candidates fused with RRF, then an optional rerank of the fused head.
+
+    `texts` is any sequence of chunk texts; it is kept by reference (not copied)
+    and only read again when reranking. `dense_search(query, n)` returns chunk
+    positions (into `texts`), best first. `reranker` is a HYBRID_RERANKER name
+    or an object with `scores(query, texts)`.
+    """
+
+    def __init__(self, texts, dense_search=None, reranker=HYBRID_RERANKER, candidate_k=HYBRID_CANDIDATES,
+                 rerank_k=HYBRID_RERANK_CANDIDATES, rrf_k=HYBRID_RRF_K):
+        self.texts = texts
+        self.bm25 = BM25Index(self.texts)
+        self.dense_search = dense_search
+        self.reranker = make_reranker(reranker, self.bm25) if reranker is None or isinstance(reranker, str) else reranker
+        self.candidate_k = candidate_k
+        self.rerank_k = rerank_k
+        self.rrf_k = rrf_k
+
+    def search(self, query, k=4):
+        """[(score, position)] of the k best chunks"""
+        with span("hybrid_retrieval", reranker=type(self.reranker).__name__ if self.reranker else None) as stage:
+            rankings = [[doc_id for _, doc_id in self.bm25.search(query, self.candidate_k)]]
+            if self.dense_search is not None:
+                rankings.append(list(self.dense_search(query, self.candidate_k))[:self.candidate_k])
+
+            limit = max(k, self.rerank_k) if self.reranker is not None else k
+            fused = reciprocal_rank_fusion(rankings, self.rrf_k, limit=limit)
+            stage.items = len(fused)
+            if self.reranker is None or not fused:
+                return fused[:k]
+
+            scores = self.reranker.scores(query, [self.texts[doc_id] for _, doc_id in fused])
+            # Stable sort: ties keep their fused order
+            order = sorted(range(len(fused)), key=lambda i: -scores[i])
+            return [(scores[i], fused[i][1]) for i in order[:k]]
@@ -0,0 +1,93 @@
+# retriever.py
+"""LangChain retrievers over a ShardedVectorStore or a hybrid BM25 + FAISS index."""
+from collections.abc import Sequence
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+class ShardedRetriever(BaseRetriever):
+    """Queries only the given namespaces and merges their top-k chunks"""
+
+    store: Any
+    namespaces: List[str]
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [
+            Document(
+                page_content=record['text'],
+                metadata={**record['metadata'], 'namespace': record['namespace'], 'distance': distance},
+            )
+            for distance, record in self.store.search(self.namespaces, query, self.k)
+        ]
+
+
+def faiss_dense_search(vectorstore):
+    """`dense_search(query, n)` returning FAISS positions, for HybridSearcher"""
+    import numpy as np
+
+    def search(query, n):
+        if vectorstore.index.ntotal == 0:
+            return []
+        vector = np.asarray([vectorstore.embedding_function.embed_query(query)], dtype=np.float32)
+        _, ids = vectorstore.index.search(vector, min(n, vectorstore.index.ntotal))
+        return [int(i) for i in ids[0] if i != -1]
+
+    return search
+
+
+class DocstoreTexts(Sequence):
+    """Chunk texts of a LangChain FAISS store by index position, read from its docstore"""
+
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+
+    def document(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[position])
+
+    def __getitem__(self, position):
+        return self.document(position).page_content
+
+    def __len__(self):
+        return self.vectorstore.index.ntotal
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + FAISS candidates fused with reciprocal-rank fusion, optionally reranked.
+
+    Chunks are read from the vectorstore, which the session manager already
+    accounts for; the retriever itself only adds the BM25 index.
+    """
+
+    searcher: Any
+    k: int = 4
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, k=4, **searcher_options):
+        """Index the chunks already held by a LangChain FAISS store, in FAISS order"""
+        from vectorstores.hybrid import HybridSearcher
+
+        searcher = HybridSearcher(
+            DocstoreTexts(vectorstore),
+            dense_search=faiss_dense_search(vectorstore),
+            **searcher_options,
+        )
+        return cls(searcher=searcher, k=k)
+
+    def approximate_bytes(self):
+        """Memory held by the retriever beyond the vectorstore it searches"""
+        return self.searcher.bm25.approximate_bytes()
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        documents = []
+        for score, position in self.searcher.search(query, self.k):
+            document = self.searcher.texts.document(position)
+            documents.append(Document(
+                page_content=document.page_content,
+                metadata={**document.metadata, 'hybrid_score': score},
+            ))
+        return documents
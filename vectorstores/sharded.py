@@ -0,0 +1,266 @@
+# sharded.py
+"""Per-patient (or per-tenant) FAISS shards kept on disk.
+
+Each namespace has its own directory with a FAISS index and a JSON list of the
+chunk texts and metadata. Shards are memory-mapped read-only when opened for
+search and kept in an LRU cache, so a query touches only the namespaces it
+asks for and a returning patient's earlier reports stay searchable.
+
+Writes never modify files in place: every write creates a new version
+directory holding both files, then atomically replaces the namespace's
+`CURRENT` pointer. Readers resolve the pointer first, so they always pair an
+index with its own records, and a cached shard is reused only while the
+pointer still names its version.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from perf.tracing import registry, span
+
+SHARD_STORE_DIR = os.getenv(
+    "SHARD_STORE_DIR", os.path.join(os.getenv("JOB_STORE_DIR", "job_store"), "shards")
+)
+SHARD_CACHE_SIZE = int(os.getenv("SHARD_CACHE_SIZE", 16))
+# Older versions are kept briefly so readers that resolved the pointer just before a swap can finish
+SHARD_KEEP_VERSIONS = 2
+
+_POINTER = "CURRENT"
+
+
+def namespace_dirname(namespace):
+    """Filesystem-safe, collision-free directory name for a namespace"""
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", namespace).strip("-")[:40] or "ns"
+    digest = hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:12]
+    return f"{slug}-{digest}"
+
+
+class Shard:
+    """One namespace: a FAISS index plus the texts and metadata of its vectors"""
+
+    def __init__(self, index, records):
+        self.index = index
+        self.records = records
+
+    def search(self, vector, k):
+        """[(distance, record)] for the k nearest chunks (L2, smaller is closer)"""
+        if self.index.ntotal == 0:
+            return []
+        distances, ids = self.index.search(vector, min(k, self.index.ntotal))
+        return [
+            (float(distance), self.records[i])
+            for distance, i in zip(distances[0], ids[0])
+            if i != -1
+        ]
+
+
+class ShardedVectorStore:
+    """Namespace-sharded FAISS store with an LRU cache of open shards"""
+
+    def __init__(self, embeddings, root=SHARD_STORE_DIR, cache_size=SHARD_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.root = root
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.opens = 0
+        self.open_seconds_total = 0.0
+        self.open_seconds_max = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    def _directory(self, namespace):
+        return os.path.join(self.root, namespace_dirname(namespace))
+
+    def _current_version(self, namespace):
+        """Version directory name the namespace's pointer names, or None if never written"""
+        try:
+            with open(os.path.join(self._directory(namespace), _POINTER), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def exists(self, namespace):
+        return self._current_version(namespace) is not None
+
+    def _read(self, namespace, version, mmap=True):
+        import faiss
+
+        directory = os.path.join(self._directory(namespace), version)
+        index_path = os.path.join(directory, "index.faiss")
+        records_path = os.path.join(directory, "records.json")
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                # Not every index type supports mmap; fall back to a normal read
+                index = None
+        if index is None:
+            index = faiss.read_index(index_path)
+        with open(records_path, encoding="utf-8") as f:
+            records = json.load(f)
+        return Shard(index, records)
+
+    def _read_current(self, namespace, attempts=3):
+        """(version, shard) for the namespace's current version, or (None, None)"""
+        for attempt in range(attempts):
+            version = self._current_version(namespace)
+            if version is None:
+                return None, None
+            try:
+                return version, self._read(namespace, version)
+            except (FileNotFoundError, RuntimeError):
+                # Pruned by a writer after we resolved the pointer; resolve it again
+                if attempt == attempts - 1:
+                    raise
+        return None, None
+
+    def open(self, namespace):
+        """Cached shard for a namespace's current version, or None if it has never been written"""
+        version = self._current_version(namespace)
+        if version is None:
+            return None
+        with self._lock:
+            cached = self._cache.get(namespace)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(namespace)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        start = time.perf_counter()
+        with span("shard_open") as stage:
+            version, shard = self._read_current(namespace)
+            if shard is None:
+                return None
+            stage.items = shard.index.ntotal
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.opens += 1
+            self.open_seconds_total += elapsed
+            self.open_seconds_max = max(self.open_seconds_max, elapsed)
+            self._cache[namespace] = (version, shard)
+            self._cache.move_to_end(namespace)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+        return shard
+
+    def _publish(self, namespace, shard):
+        """Write the shard as a new version and point the namespace at it"""
+        import faiss
+
+        directory = self._directory(namespace)
+        os.makedirs(directory, exist_ok=True)
+        versions = sorted(name for name in os.listdir(directory) if name.startswith("v"))
+        number = int(versions[-1][1:].split("-")[0]) + 1 if versions else 1
+        version = f"v{number:08d}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(directory, version)
+        os.makedirs(version_dir)
+        faiss.write_index(shard.index, os.path.join(version_dir, "index.faiss"))
+        with open(os.path.join(version_dir, "records.json"), 'w', encoding="utf-8") as f:
+            json.dump(shard.records, f)
+
+        pointer = os.path.join(directory, _POINTER)
+        with open(pointer + ".tmp", 'w', encoding="utf-8") as f:
+            f.write(version)
+        os.replace(pointer + ".tmp", pointer)
+
+        for old in (versions + [version])[:-SHARD_KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+        return version
+
+    def add_texts(self, namespace, texts, metadatas=None, dedup_key=None):
+        """Embed and append chunks to a namespace; returns the number added.
+
+        When `dedup_key` is given, texts are skipped if the shard already holds
+        records whose metadata has the same value for that key (e.g. a job id).
+        """
+        import faiss
+        import numpy as np
+
+        metadatas = metadatas or [{} for _ in texts]
+        with self._write_lock, span("shard_write", namespace=namespace) as stage:
+            version = self._current_version(namespace)
+            shard = self._read(namespace, version, mmap=False) if version else None
+
+            if shard is not None and dedup_key is not None:
+                value = metadatas[0].get(dedup_key) if metadatas else None
+                if value is not None and any(r['metadata'].get(dedup_key) == value for r in shard.records):
+                    stage.items = 0
+                    return 0
+
+            vectors = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+            if shard is None:
+                shard = Shard(faiss.IndexFlatL2(vectors.shape[1]), [])
+            shard.index.add(vectors)
+            shard.records.extend({'text': text, 'metadata': meta} for text, meta in zip(texts, metadatas))
+
+            self._publish(namespace, shard)
+            with self._lock:
+                self._cache.pop(namespace, None)
+            stage.items = len(texts)
+            return len(texts)
+
+    def search(self, namespaces, query, k=4):
+        """Top-k (distance, record) pairs merged across the given namespaces"""
+        import numpy as np
+
+        vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+        results = []
+        for namespace in namespaces:
+            shard = self.open(namespace)
+            if shard is not None:
+                results.extend(
+                    (distance, {**record, 'namespace': namespace})
+                    for distance, record in shard.search(vector, k)
+                )
+        results.sort(key=lambda item: item[0])
+        return results[:k]
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'open_shards': len(self._cache),
+                'cache_size': self.cache_size,
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'cache_hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'opens': self.opens,
+                'open_seconds_avg': self.open_seconds_total / self.opens if self.opens else 0.0,
+                'open_seconds_max': self.open_seconds_max,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_shard_store(embeddings):
+    """Process-wide sharded store; `embeddings` is used on first creation"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ShardedVectorStore(embeddings)
+            registry.register_gauges("shards", _store.metrics)
+        return _store
+
+
+def get_metrics():
+    """Shard cache metrics, or {} before the store is first used"""
+    with _store_lock:
+        store = _store
+    return store.metrics() if store is not None else {}